@@ -0,0 +1,205 @@
+"""Benchmarks for the clipboard store and list view, reported as JSON.
+
+    python clipboard_bench.py --sizes 1000,10000,100000 --output bench.json
+
+Each size gets a fresh store filled from a synthetic legacy data file.
+Rendering is measured only when a display is available; without one an
+Xvfb server is started if installed, otherwise the render step is skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from clipboard_store import ItemStore, STORAGE_BACKENDS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+LABELS = ["Token", "User", "Password", "Email", "Host", "Port", "Key", "Secret", "URL", "Note"]
+SEARCH_QUERIES = ["item 12", "token", "zz-no-match", "host 9"]
+
+
+def generate_items(count, max_contexts=5, value_size=32, seed=0):
+    """Synthetic clipboard_data.json list: mostly multi-context items, some old formats."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    items = []
+    for i in range(count):
+        size = max(1, int(rng.expovariate(1 / value_size)))
+        if i % 50 == 0:
+            items.append(''.join(rng.choices(alphabet, k=size)))
+        elif i % 20 == 0:
+            items.append({'title': f"Item {i}", 'content': ''.join(rng.choices(alphabet, k=size))})
+        else:
+            contexts = [
+                {'label': rng.choice(LABELS), 'value': f"{i} " + ''.join(rng.choices(alphabet, k=size))}
+                for _ in range(rng.randint(1, max_contexts))
+            ]
+            items.append({'title': f"Item {i}", 'contexts': contexts, 'type': 'multi_context'})
+    return items
+
+
+class Timer:
+    """Collects named timings as {"seconds", "ops", "per_op_us"}."""
+
+    def __init__(self):
+        self.results = {}
+
+    def time(self, name, func, ops=1):
+        started = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - started
+        self.results[name] = {
+            'seconds': round(elapsed, 6),
+            'ops': ops,
+            'per_op_us': round(elapsed / max(ops, 1) * 1e6, 3),
+        }
+        return value
+
+
+def bench_store(directory, count, backend, args):
+    data_file = os.path.join(directory, "clipboard_data.json")
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump(generate_items(count, args.max_contexts, args.value_size), f)
+
+    timer = Timer()
+    store = ItemStore(data_file, backend, save_delay=0)
+    timer.time('migrate', store.load_all, count)
+    store.close()
+
+    store = ItemStore(data_file, backend, save_delay=0)
+    timer.time('load', store.load_all, count)
+    timer.time('first_page', lambda: (store.start_loading(), store.load_page()), 1)
+    store.load_all()
+
+    titles = [f"Item {i}" for i in range(1, count, max(count // 1000, 1))]
+    timer.time('duplicate_check', lambda: [store.has_title(title) for title in titles], len(titles))
+
+    new_items = [
+        {'title': f"New {i}", 'contexts': [{'label': 'Token', 'value': str(i)}], 'type': 'multi_context'}
+        for i in range(args.ops)
+    ]
+    keys = timer.time('add', lambda: [store.add(item) for item in new_items], args.ops)
+    timer.time('delete', lambda: [store.delete(key) for key in keys], args.ops)
+    timer.time('flush', store.flush)
+    timer.time('save', store.storage.compact)
+
+    # Built lazily, so left alone it would land on the first query's timing
+    timer.time('search_index', lambda: store.index_pending(None), len(store.items))
+    for query in SEARCH_QUERIES:
+        timer.time(f"search:{query}", lambda: store.search(query))
+    timer.time('fuzzy', lambda: store.fuzzy("itm tok"))
+    timer.time('close', store.close)
+
+    # Peak Python allocations of a cold load, measured separately from the timings
+    store = ItemStore(data_file, backend, save_delay=0)
+    tracemalloc.start()
+    store.load_all()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    store.close()
+
+    files = {name: os.path.getsize(os.path.join(directory, name)) for name in sorted(os.listdir(directory))}
+    return timer.results, {'load_current_bytes': current, 'load_peak_bytes': peak}, files
+
+
+def bench_render(directory, backend):
+    """Time the window's startup page, full load, refresh and a scroll to the middle."""
+    import copy_1
+
+    timer = Timer()
+    data_file = os.path.join(directory, "clipboard_data.json")
+    app = timer.time('window_open', lambda: copy_1.ClipboardManager(data_file, backend, save_delay=0))
+    app.root.update()
+    timer.time('finish_loading', app._finish_loading)
+    timer.time('refresh_items', app.refresh_items)
+
+    def scroll():
+        app.canvas.yview_moveto(0.5)
+        app.render_visible_rows()
+    timer.time('scroll', scroll)
+    timer.time('delete_item', lambda: app.delete_item(app._view_keys[len(app._view_keys) // 2]))
+    results = dict(timer.results, rendered_rows=len(app._rendered_rows))
+    app.on_closing()
+    return results
+
+
+def start_display():
+    """Return an Xvfb process if one had to be started, or a reason rendering can't run."""
+    if os.environ.get('DISPLAY'):
+        return None, None
+    if shutil.which('Xvfb') is None:
+        return None, "no DISPLAY and Xvfb is not installed"
+    display = ':%d' % (90 + os.getpid() % 100)
+    server = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x1024x24'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1)
+    return server, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the clipboard store and list view")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated item counts, up to 1000000")
+    parser.add_argument("--backend", action='append', choices=sorted(STORAGE_BACKENDS),
+                        help="repeat to bench several; default all")
+    parser.add_argument("--max-contexts", type=int, default=5)
+    parser.add_argument("--value-size", type=int, default=32, help="mean value length in characters")
+    parser.add_argument("--ops", type=int, default=200, help="items added and deleted per size")
+    parser.add_argument("--no-render", action='store_true')
+    parser.add_argument("--output", default='-', help="JSON output path, - for stdout")
+    args = parser.parse_args(argv)
+
+    server, render_skipped = (None, "--no-render") if args.no_render else start_display()
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'max_contexts': args.max_contexts,
+            'value_size': args.value_size,
+            'render_skipped': render_skipped,
+        },
+        'results': [],
+    }
+    try:
+        for backend in args.backend or sorted(STORAGE_BACKENDS):
+            for count in (int(size) for size in args.sizes.split(',')):
+                with tempfile.TemporaryDirectory() as directory:
+                    print(f"{backend} {count}...", file=sys.stderr)
+                    timings, memory, files = bench_store(directory, count, backend, args)
+                    result = {'backend': backend, 'count': count, 'timings': timings,
+                              'memory': memory, 'files': files}
+                    if render_skipped is None:
+                        result['render'] = bench_render(directory, backend)
+                    report['results'].append(result)
+    finally:
+        if server is not None:
+            server.terminate()
+
+    if resource is not None:
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        report['meta']['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Command line access to the clipboard store, no display needed.
+
+    python clipboard_cli.py add GitHub Token=ghp_x User=me
+    python clipboard_cli.py get GitHub --label Token
+    python clipboard_cli.py search git
+    python clipboard_cli.py export backup.json
+    python clipboard_cli.py encrypt
+    python clipboard_cli.py compact
+
+An encrypted store's passphrase is read from CLIPBOARD_PASSPHRASE, or
+asked for on the terminal.
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+
+try:
+    import pyperclip
+except ImportError:
+    pyperclip = None
+
+from clipboard_store import (
+    ItemStore, Item, DuplicateTitleError, PassphraseError, STORAGE_BACKENDS, key_file_path,
+)
+from clipboard_io import FORMATS, guess_format, read_items, write_items
+from clipboard_trace import tracer
+
+# Bad records listed individually on import before only counting them
+MAX_REPORTED_ERRORS = 20
+
+
+def parse_context(text):
+    label, sep, value = text.partition('=')
+    if not sep or not label.strip() or not value.strip():
+        raise argparse.ArgumentTypeError(f"expected LABEL=VALUE, got {text!r}")
+    return label.strip(), value.strip()
+
+
+def find_text(store, title, label):
+    """(key, text) of the newest item titled title, or of its context labelled label."""
+    key = store.find_title(title)
+    if key is None:
+        raise SystemExit(f"No item titled {title!r}")
+    text = store.copy_text(key, label)
+    if text is None:
+        raise SystemExit(f"{title!r} has no context labelled {label!r}")
+    return key, text
+
+
+def cmd_add(store, args):
+    item = Item.multi_context(args.title, args.contexts)
+    try:
+        store.add(item)
+    except DuplicateTitleError as e:
+        raise SystemExit(str(e))
+
+
+def cmd_get(store, args):
+    print(find_text(store, args.title, args.label)[1])
+
+
+def cmd_copy(store, args):
+    if pyperclip is None:
+        raise SystemExit("copy needs the pyperclip package")
+    key, text = find_text(store, args.title, args.label)
+    pyperclip.copy(text)
+    store.record_copy(key, args.label)
+
+
+def cmd_search(store, args):
+    for key in store.search(args.query)[:args.limit]:
+        item = store.get(key)
+        print(item.title or item.copy_text()[:80])
+
+
+def cmd_import(store, args):
+    fmt = args.format or guess_format(args.file)
+    errors = []
+
+    def on_error(position, message):
+        errors.append(position)
+        if len(errors) <= MAX_REPORTED_ERRORS:
+            print(f"{args.file}: {position}: {message}", file=sys.stderr)
+
+    f = sys.stdin if args.file == '-' else open(args.file, 'r', encoding='utf-8', newline='')
+    try:
+        added, skipped = store.add_many(read_items(f, fmt, on_error))
+    except json.JSONDecodeError as e:
+        # A broken JSON list can't be resynchronized; what was read before stays imported
+        raise SystemExit(f"{args.file}: {e}")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    print(f"Imported {added} items, skipped {skipped} duplicates and {len(errors)} invalid records",
+          file=sys.stderr)
+
+
+def cmd_export(store, args):
+    fmt = args.format or guess_format(args.file)
+    # Oldest first, blobs inlined, one item in memory at a time
+    items = (store.resolve_item(key) for key in sorted(store.items))
+    if args.file == '-':
+        write_items(sys.stdout, items, fmt)
+    else:
+        with open(args.file, 'w', encoding='utf-8', newline='') as f:
+            write_items(f, items, fmt)
+
+
+def cmd_encrypt(store, args):
+    changed = store.seal_all()
+    # Rewrite the snapshot or database so the plaintext copies go away
+    store.compact()
+    print(f"Encrypted the values of {changed} items; new values are encrypted from now on", file=sys.stderr)
+
+
+def cmd_compact(store, args):
+    storage = store.storage
+    if args.format:
+        if not hasattr(storage, 'snapshot_format'):
+            raise SystemExit("--format only applies to the journal backend")
+        storage.snapshot_format = args.format
+    files = store_files(store.data_file)
+    before = sum(files.values())
+    store.compact()
+    store.flush()
+    files = store_files(store.data_file)
+    for name, size in sorted(files.items()):
+        print(f"{size:>12}  {name}", file=sys.stderr)
+    print(f"{before} -> {sum(files.values())} bytes", file=sys.stderr)
+
+
+def store_files(data_file):
+    """{name: size} of the store's files other than the original data file, which stays as a backup."""
+    directory, name = os.path.split(data_file)
+    base = os.path.splitext(name)[0] + "."
+    return {
+        entry.name: entry.stat().st_size for entry in os.scandir(directory)
+        if entry.name.startswith(base) and entry.name != name and entry.is_file()
+    }
+
+
+def read_passphrase(data_file, command):
+    """The passphrase for an encrypted store, or for one about to be encrypted; else None."""
+    exists = os.path.exists(key_file_path(data_file))
+    if not exists and command != 'encrypt':
+        return None
+    passphrase = os.environ.get('CLIPBOARD_PASSPHRASE')
+    if passphrase is None:
+        try:
+            passphrase = getpass.getpass("Passphrase: ")
+            if not exists and getpass.getpass("Repeat passphrase: ") != passphrase:
+                raise SystemExit("The passphrases don't match")
+        except EOFError:
+            raise SystemExit("No passphrase given")
+    return passphrase
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Clipboard Manager store from the command line")
+    parser.add_argument("--data-file", default="clipboard_data.json")
+    parser.add_argument("--backend", choices=sorted(STORAGE_BACKENDS), default='journal')
+    parser.add_argument("--trace", metavar='FILE', help="write a Chrome trace of the run and print its timings")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="add an item with one or more contexts")
+    add.add_argument('title')
+    add.add_argument('contexts', nargs='+', type=parse_context, metavar='LABEL=VALUE')
+    add.set_defaults(func=cmd_add)
+
+    for name, func, help in (('get', cmd_get, "print an item's text"),
+                             ('copy', cmd_copy, "copy an item's text to the clipboard")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('title')
+        command.add_argument('--label', help="only this context's value")
+        command.set_defaults(func=func)
+
+    search = commands.add_parser('search', help="list the titles of matching items, newest first")
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=20)
+    search.set_defaults(func=cmd_search)
+
+    import_ = commands.add_parser('import', help="add items from a file, skipping duplicate titles")
+    import_.add_argument('file', help="path, or - for stdin")
+    import_.set_defaults(func=cmd_import)
+
+    export = commands.add_parser('export', help="write all items to a file")
+    export.add_argument('file', help="path, or - for stdout")
+    export.set_defaults(func=cmd_export)
+
+    encrypt = commands.add_parser('encrypt', help="encrypt the stored values; asks for a new passphrase")
+    encrypt.set_defaults(func=cmd_encrypt)
+
+    compact = commands.add_parser('compact', help="rewrite the store in its compact form, converting older formats")
+    compact.add_argument('--format', choices=('binary', 'json'), help="journal snapshot layout; default: binary")
+    compact.set_defaults(func=cmd_compact)
+
+    for command in (import_, export):
+        command.add_argument('--format', choices=FORMATS, help="default: from the file extension, else json")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        tracer.enable()
+    try:
+        store = ItemStore(args.data_file, args.backend, save_delay=0,
+                          passphrase=read_passphrase(args.data_file, args.command))
+    except PassphraseError as e:
+        raise SystemExit(str(e))
+    try:
+        store.load_all()
+        args.func(store, args)
+    finally:
+        store.close()
+        if args.trace:
+            tracer.write_chrome_trace(args.trace)
+            print(tracer.format_summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
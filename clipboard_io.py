@@ -0,0 +1,133 @@
+"""Streaming readers and writers for bulk import and export.
+
+Three formats are supported:
+
+- json: the original clipboard_data.json list, read element by element
+- jsonl: one item per line, in the same shape as the list elements
+- csv: title,label,value rows; consecutive rows with the same title form one
+  multi-context item, and a row with an empty label is a title/content item
+
+Readers yield validated Items one at a time and report bad records to an
+error callback, so memory does not grow with the size of the input.
+"""
+import csv
+import json
+
+from clipboard_store import Item, iter_json_array
+
+FORMATS = ('json', 'jsonl', 'csv')
+CSV_HEADER = ['title', 'label', 'value']
+
+
+def guess_format(path, default='json'):
+    for fmt in FORMATS:
+        if path.lower().endswith('.' + fmt):
+            return fmt
+    return default
+
+
+def parse_record(data):
+    """Validate one JSON record and return it as an Item; raises ValueError."""
+    if isinstance(data, str):
+        if not data:
+            raise ValueError("empty text")
+        return Item('text', content=data)
+    if not isinstance(data, dict):
+        raise ValueError("expected an object or a string")
+    if 'blob' in data:
+        raise ValueError("blob references can't be imported; export with values inlined")
+    title = data.get('title')
+    if title is not None and not isinstance(title, str):
+        raise ValueError("title must be a string")
+    if data.get('type') == 'multi_context':
+        contexts = data.get('contexts')
+        if not title or not title.strip():
+            raise ValueError("multi-context items need a title")
+        if not isinstance(contexts, list) or not contexts:
+            raise ValueError("multi-context items need at least one context")
+        for ctx in contexts:
+            if not isinstance(ctx, dict) or not isinstance(ctx.get('label'), str) \
+                    or not isinstance(ctx.get('value'), str):
+                raise ValueError("contexts need a string label and value")
+    elif not isinstance(data.get('content'), str):
+        raise ValueError("expected contexts or a string content")
+    return Item.from_json(data)
+
+
+def read_items(f, fmt, on_error):
+    """Yield Items from a text file; on_error(position, message) gets the bad records."""
+    if fmt == 'csv':
+        yield from read_csv(f, on_error)
+        return
+    if fmt == 'jsonl':
+        records = ((number, line) for number, line in enumerate(f, start=1) if line.strip())
+        records = ((f"line {number}", _loads(line)) for number, line in records)
+    else:
+        records = ((f"element {number}", data) for number, data in enumerate(iter_json_array(f), start=1))
+    for position, data in records:
+        try:
+            if isinstance(data, json.JSONDecodeError):
+                raise ValueError(f"invalid JSON: {data.msg}")
+            yield parse_record(data)
+        except ValueError as e:
+            on_error(position, str(e))
+
+
+def _loads(line):
+    # A bad line is reported like any other invalid record instead of ending the import
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return e
+
+
+def read_csv(f, on_error):
+    reader = csv.reader(f)
+    title = contexts = None
+    for row in reader:
+        if reader.line_num == 1 and [cell.strip().lower() for cell in row] == CSV_HEADER:
+            continue
+        if len(row) != 3:
+            on_error(f"line {reader.line_num}", "expected title,label,value")
+            continue
+        row_title, label, value = row
+        if not value:
+            on_error(f"line {reader.line_num}", "empty value")
+            continue
+        if contexts and row_title == title and label:
+            contexts.append((label, value))
+            continue
+        if contexts:
+            yield Item.multi_context(title, contexts)
+        title = contexts = None
+        if label:
+            if not row_title.strip():
+                on_error(f"line {reader.line_num}", "multi-context items need a title")
+            else:
+                title, contexts = row_title, [(label, value)]
+        elif row_title:
+            yield Item('simple', row_title, content=value)
+        else:
+            yield Item('text', content=value)
+    if contexts:
+        yield Item.multi_context(title, contexts)
+
+
+def write_items(f, items, fmt):
+    """Write Items (with blob values already inlined) to a text file, one at a time."""
+    if fmt == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for item in items:
+            if item.kind == 'multi_context':
+                writer.writerows((item.title, ctx.label, ctx.value) for ctx in item.contexts)
+            else:
+                writer.writerow((item.title or '', '', item.content or ''))
+    elif fmt == 'jsonl':
+        for item in items:
+            f.write(json.dumps(item.to_json()) + "\n")
+    else:
+        f.write("[")
+        for number, item in enumerate(items):
+            f.write(("," if number else "") + "\n  " + json.dumps(item.to_json()))
+        f.write("\n]\n")
@@ -0,0 +1,287 @@
+"""Request/response API of a running Clipboard Manager over a Unix socket.
+
+Scripts and hotkey tools get answers from the window's in-memory store
+instead of starting a second one. Requests and replies are one JSON object
+per line:
+
+    {"op": "get", "title": "GitHub", "label": "Token"}     -> {"ok": true, "result": "ghp_x"}
+    {"op": "search", "query": "git", "limit": 5}           -> {"ok": true, "result": [{"key": 1, "title": "GitHub"}]}
+    {"op": "copy", "title": "GitHub"}                      -> {"ok": true, "result": null}
+    {"op": "add", "item": {"title": "GitHub", "type": "multi_context",
+                           "contexts": [{"label": "Token", "value": "ghp_x"}]}}  -> {"ok": true, "result": 2}
+    {"op": "delete", "title": "GitHub"}                    -> {"ok": true, "result": 2}
+    {"op": "launcher"}                                     -> {"ok": true, "result": null}
+
+"show" and "hide" do the same for the main window, and "quit" stops the
+serving process. Failures come back as {"ok": false, "error": "..."}. The
+client side only needs the standard library, so it starts in milliseconds
+and can be bound to a global hotkey in the desktop's keyboard settings:
+
+    python clipboard_ipc.py get GitHub --label Token
+    python clipboard_ipc.py launcher
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import socket
+import stat
+import tempfile
+import threading
+
+# Longest request line the server reads
+MAX_REQUEST_BYTES = 1 << 20
+# Seconds the client waits for a reply
+REQUEST_TIMEOUT = 5.0
+
+
+class IPCError(Exception):
+    """The server answered a request with an error."""
+
+
+def socket_path(data_file):
+    """Socket of the window serving data_file, in a directory only this user can enter."""
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(), f"copy-thingy-{os.getuid()}")
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # /tmp is shared: someone else may have made the directory first, or a link in its place
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) != 0o700:
+            raise PermissionError(f"{directory} is not a directory private to this user")
+    # Hashed, since a socket path can't be longer than about 100 bytes
+    digest = hashlib.sha1(os.path.abspath(data_file).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directory, f"copy-thingy-{digest}.sock")
+
+
+def request(path, payload, timeout=REQUEST_TIMEOUT):
+    """Send one request and return its result; raises IPCError or OSError."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(payload).encode('utf-8') + b"\n")
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise IPCError("The server closed the connection")
+    reply = json.loads(line)
+    if not reply.get('ok'):
+        raise IPCError(reply.get('error'))
+    return reply.get('result')
+
+
+class IPCServer:
+    """Serves the socket from an asyncio loop on its own thread.
+
+    The loop only reads and writes; each request is answered by
+    dispatch(request) on the thread that calls run_pending(), which in the
+    window is the Tk thread, so the store is never touched concurrently.
+    notify_fd turns readable whenever requests are waiting, for Tk's
+    createfilehandler.
+    """
+
+    def __init__(self, path, dispatch):
+        self.path = path
+        self.dispatch = dispatch
+        self._jobs = queue.Queue()
+        self._loop = None
+        self._thread = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    @property
+    def notify_fd(self):
+        return self._wake_r
+
+    def start(self):
+        """Listen on the socket; returns False if another process already serves it."""
+        if self._alive():
+            return False
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            sock.listen()
+        except OSError:
+            sock.close()
+            raise
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, args=(sock,), name="ipc", daemon=True)
+        self._thread.start()
+        return True
+
+    def run_pending(self):
+        """Answer every waiting request."""
+        try:
+            os.read(self._wake_r, 4096)
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                payload, future = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                reply = {'ok': True, 'result': self.dispatch(payload)}
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e)}
+            self._loop.call_soon_threadsafe(self._resolve, future, reply)
+
+    def close(self):
+        if self._thread is not None:
+            # One loop iteration late, so replies resolved just before (e.g. to a quit) still get written
+            self._loop.call_soon_threadsafe(self._loop.call_soon, self._loop.stop)
+            self._thread.join()
+            self._thread = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        if self._wake_r is not None:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+
+    def _alive(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe.settimeout(0.5)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            return False
+        else:
+            return True
+        finally:
+            probe.close()
+
+    def _run(self, sock):
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(asyncio.start_unix_server(self._serve, sock=sock, limit=MAX_REQUEST_BYTES))
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(self._encode({'ok': False, 'error': "request too long"}))
+                    break
+                if not line:
+                    break
+                try:
+                    payload = json.loads(line)
+                except ValueError as e:
+                    reply = {'ok': False, 'error': f"invalid JSON: {e}"}
+                else:
+                    if isinstance(payload, dict):
+                        future = self._loop.create_future()
+                        self._jobs.put((payload, future))
+                        self._wake()
+                        reply = await future
+                    else:
+                        reply = {'ok': False, 'error': "expected a JSON object"}
+                writer.write(self._encode(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # Shutting down with the client still connected; ending quietly keeps asyncio from logging it
+            pass
+        finally:
+            writer.close()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            # The pipe is full, so it is readable already
+            pass
+
+    @staticmethod
+    def _resolve(future, reply):
+        if not future.done():
+            future.set_result(reply)
+
+    @staticmethod
+    def _encode(reply):
+        return json.dumps(reply).encode('utf-8') + b"\n"
+
+
+def parse_context(text):
+    # Same as clipboard_cli's, which isn't imported to keep the client's startup small
+    label, sep, value = text.partition('=')
+    if not sep or not label.strip() or not value.strip():
+        raise argparse.ArgumentTypeError(f"expected LABEL=VALUE, got {text!r}")
+    return {'label': label.strip(), 'value': value.strip()}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Talk to a running Clipboard Manager")
+    parser.add_argument("--data-file", default="clipboard_data.json", help="the store the window serves")
+    parser.add_argument("--socket", help="socket path; default: derived from --data-file")
+    commands = parser.add_subparsers(dest='op', required=True)
+
+    for name, help in (('get', "print an item's text"), ('copy', "copy an item's text in the window")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('title')
+        command.add_argument('--label', help="only this context's value")
+
+    search = commands.add_parser('search', help="list the titles of matching items, newest first")
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=20)
+
+    add = commands.add_parser('add', help="add an item with one or more contexts")
+    add.add_argument('title')
+    add.add_argument('contexts', nargs='+', type=parse_context, metavar='LABEL=VALUE')
+
+    delete = commands.add_parser('delete', help="delete the newest item with this title")
+    delete.add_argument('title')
+
+    for name, help in (('launcher', "open the Quick Copy launcher"), ('show', "show the main window"),
+                       ('hide', "hide the main window"), ('quit', "stop the Clipboard Manager")):
+        commands.add_parser(name, help=help)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    payload = {key: value for key, value in vars(args).items()
+               if key not in ('data_file', 'socket', 'contexts') and value is not None}
+    if args.op == 'add':
+        payload = {'op': 'add', 'item': {'title': args.title, 'type': 'multi_context', 'contexts': args.contexts}}
+    try:
+        path = args.socket or socket_path(args.data_file)
+    except OSError as e:
+        raise SystemExit(str(e))
+    try:
+        result = request(path, payload)
+    except IPCError as e:
+        raise SystemExit(str(e))
+    except OSError as e:
+        raise SystemExit(f"No Clipboard Manager is serving {path}: {e}")
+    if args.op == 'get':
+        print(result)
+    elif args.op == 'search':
+        for match in result:
+            print(match['title'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3139 @@
+"""Headless clipboard item store: data model, persistence and search, no Tk."""
+import base64
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import os
+import queue
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from itertools import accumulate, islice
+
+from clipboard_trace import tracer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = InvalidTag = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Items read per page while the store streams in
+LOAD_PAGE_SIZE = 200
+# Items indexed for search per idle step once loading is done
+INDEX_BATCH = 200
+# Seconds the persistence worker waits for more changes before writing
+SAVE_DELAY = 0.25
+# Values longer than this many characters are kept in the blob file
+BLOB_THRESHOLD = 4096
+# Characters of a blob value kept inline for display and search
+PREVIEW_CHARS = 200
+# Shorter values are cheaper inline than as a reference to a shared copy on disk
+SHARED_MIN_CHARS = 16
+# Items per storage write during a bulk import
+IMPORT_BATCH = 1000
+# Bounds of the captured clipboard history
+HISTORY_ENTRIES = 200
+HISTORY_BYTES = 4 * 1024 * 1024
+# Shown in place of an encrypted value
+SEALED_MASK = "••••••"
+# Snapshot layout compaction writes: 'binary' or 'json'; both are read
+SNAPSHOT_FORMAT = 'binary'
+# Block compression of binary snapshots: 'zstd' (needs zstandard), 'zlib' or 'none'
+SNAPSHOT_CODEC = 'zstd' if zstandard is not None else 'zlib'
+# Items per compressed block of a binary snapshot
+SNAPSHOT_BLOCK_ITEMS = 1000
+# Seconds after which a copy counts half as much towards an item's frecency
+USAGE_HALF_LIFE = 7 * 24 * 3600
+# Items pinned above the list, and the frecency score that earns a place there (a few recent copies)
+HOT_ITEMS = 5
+HOT_MIN_SCORE = 1.5
+# Launcher points per frecency score unit, up to USAGE_BOOST_MAX units
+USAGE_WEIGHT = 5
+USAGE_BOOST_MAX = 10
+# Resolved texts of values copied at least HOT_VALUE_COPIES times, kept ready to copy again
+HOT_VALUES = 32
+HOT_VALUE_COPIES = 2
+# Versions kept for undo, redo and restore
+VERSIONS_KEPT = 500
+
+
+class BlobRef:
+    """Stands in for a large value kept in the BlobStore: its hash, size and a preview."""
+
+    __slots__ = ('digest', 'size', 'preview')
+
+    def __init__(self, digest, size, preview):
+        self.digest = digest
+        self.size = size
+        self.preview = preview
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['blob'], data['size'], data['preview'])
+
+    def to_json(self):
+        return {'blob': self.digest, 'size': self.size, 'preview': self.preview}
+
+    def __str__(self):
+        return self.preview
+
+    def __repr__(self):
+        return f"BlobRef({self.digest[:12]!r}, {self.size})"
+
+
+class SealedValue:
+    """Stands in for a value encrypted by the store's Vault: base64 of nonce and ciphertext.
+
+    Tokens bound to the item key and label they are stored under carry
+    Vault.BOUND_PREFIX.
+    """
+
+    __slots__ = ('token',)
+
+    def __init__(self, token):
+        self.token = token
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['sealed'])
+
+    def to_json(self):
+        return {'sealed': self.token}
+
+    def __str__(self):
+        return SEALED_MASK
+
+    def __repr__(self):
+        return f"SealedValue({self.token[:12]!r}...)"
+
+
+def value_from_json(data, shared=None):
+    """A saved value: plain text, a {'blob', 'size', 'preview'} reference, a
+    {'sealed': token} encrypted value or a {'v': index} reference into a
+    snapshot's table of shared values."""
+    if not isinstance(data, dict):
+        return data
+    if 'v' in data:
+        return shared[data['v']]
+    if 'sealed' in data:
+        return SealedValue.from_json(data)
+    return BlobRef.from_json(data)
+
+
+def value_to_json(value, shared=None):
+    if isinstance(value, (BlobRef, SealedValue)):
+        return value.to_json()
+    if shared is not None and value in shared:
+        return {'v': shared[value]}
+    return value
+
+
+class ValuePool:
+    """Reference-counted canonical copies of values.
+
+    Equal values acquired through the pool come back as the same string
+    object, so memory grows with unique content. Each acquire must be paired
+    with a release; a value is dropped once nothing refers to it.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def acquire(self, value):
+        if not isinstance(value, str):
+            return value
+        entry = self._entries.get(value)
+        if entry is None:
+            entry = self._entries[value] = [value, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, value):
+        entry = self._entries.get(value) if isinstance(value, str) else None
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._entries[value]
+
+    def refcount(self, value):
+        entry = self._entries.get(value)
+        return entry[1] if entry else 0
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Context:
+    """One labelled value of a multi-context item. Labels are interned.
+
+    value is a str, a BlobRef for values kept out of line or a SealedValue.
+    """
+
+    __slots__ = ('label', 'value')
+
+    def __init__(self, label, value):
+        self.label = sys.intern(label)
+        self.value = value
+
+    def __repr__(self):
+        return f"Context({self.label!r}, {self.value!r})"
+
+
+class Item:
+    """A stored clipboard item, normalized from any of the saved formats.
+
+    kind is 'multi_context' (title plus contexts), 'simple' (the old
+    title/content dicts) or 'text' (the oldest bare strings). to_json() gives
+    back the format the item was read from. Context values and content may
+    be BlobRefs; copy_text takes a resolve function to read them back.
+    """
+
+    __slots__ = ('kind', 'title', 'contexts', 'content')
+
+    def __init__(self, kind, title=None, contexts=(), content=None):
+        self.kind = kind
+        self.title = title
+        self.contexts = tuple(contexts)
+        self.content = content
+
+    @classmethod
+    def multi_context(cls, title, contexts):
+        """contexts is an iterable of (label, value) pairs."""
+        return cls('multi_context', title, [Context(label, value) for label, value in contexts])
+
+    @classmethod
+    def from_json(cls, data, shared=None):
+        """shared is the value table of the snapshot the item was read from, if any."""
+        if isinstance(data, Item):
+            return data
+        if not isinstance(data, dict):
+            return cls('text', content=str(data))
+        if 'blob' in data or 'sealed' in data:
+            # A bare string that was moved to the blob file or encrypted
+            return cls('text', content=value_from_json(data))
+        if data.get('type') == 'multi_context':
+            return cls('multi_context', data.get('title'),
+                       [Context(ctx['label'], value_from_json(ctx['value'], shared))
+                        for ctx in data.get('contexts', [])])
+        content = data.get('content')
+        if content is not None and not isinstance(content, dict):
+            content = str(content)
+        return cls('simple', data.get('title'), content=value_from_json(content, shared))
+
+    def to_json(self, shared=None):
+        """shared maps values to their index in a snapshot's value table."""
+        if self.kind == 'multi_context':
+            return {
+                'title': self.title,
+                'contexts': [{'label': ctx.label, 'value': value_to_json(ctx.value, shared)} for ctx in self.contexts],
+                'type': 'multi_context'
+            }
+        if self.kind == 'simple':
+            data = {} if self.title is None else {'title': self.title}
+            if self.content is not None:
+                data['content'] = value_to_json(self.content, shared)
+            return data
+        return value_to_json(self.content)
+
+    @property
+    def display_title(self):
+        return self.title or 'Untitled'
+
+    def search_text(self):
+        """Lowercased text a search can match; blob values contribute their preview."""
+        parts = [self.title or '']
+        for context in self.contexts:
+            parts.append(context.label)
+            parts.append(str(context.value))
+        if self.content is not None:
+            parts.append(str(self.content))
+        return "\n".join(parts).lower()
+
+    def copy_text(self, label=None, resolve=None):
+        """Text the Copy buttons put on the clipboard; one context's value if label is given.
+
+        resolve(value, label) turns each value into text, label being its
+        context's (None for content); the default gives blob previews.
+        """
+        if resolve is None:
+            resolve = lambda value, label: str(value)
+        if self.kind != 'multi_context':
+            return None if label is not None else resolve(self.content or '', None)
+        if label is None:
+            return "\n".join(f"{ctx.label}: {resolve(ctx.value, ctx.label)}" for ctx in self.contexts)
+        for context in self.contexts:
+            if context.label == label:
+                return resolve(context.value, label)
+        return None
+
+    def values(self):
+        """The item's context values, or its content."""
+        if self.kind == 'multi_context':
+            return [ctx.value for ctx in self.contexts]
+        return [] if self.content is None else [self.content]
+
+    def share_values(self, pool):
+        """Swap the item's values for the pool's shared copies, in place.
+
+        Only done before the item is handed out, e.g. while it is being loaded.
+        """
+        for context in self.contexts:
+            context.value = pool.acquire(context.value)
+        if self.content is not None:
+            self.content = pool.acquire(self.content)
+
+    def map_values(self, func):
+        """Return a copy of the item with func applied to every value."""
+        return self.map_contexts(lambda label, value: func(value))
+
+    def map_contexts(self, func):
+        """Like map_values, calling func(label, value); content has the label None."""
+        if self.kind == 'multi_context':
+            return Item(self.kind, self.title, [Context(ctx.label, func(ctx.label, ctx.value)) for ctx in self.contexts])
+        content = None if self.content is None else func(None, self.content)
+        return Item(self.kind, self.title, content=content)
+
+    def __repr__(self):
+        return f"Item.from_json({self.to_json()!r})"
+
+
+def read_legacy_items(path):
+    """Read the original clipboard_data.json list, or None if it is unusable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            loaded_items = json.load(f)
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON from {path}. Starting with an empty list.")
+        return None
+    return loaded_items if isinstance(loaded_items, list) else None
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Yield the elements of a top-level JSON array without reading it all at once."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    read_size = chunk_size
+    state = 'open'
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            chunk = f.read(read_size)
+            buf, pos, eof = chunk, 0, not chunk
+            continue
+
+        char = buf[pos]
+        if state == 'open':
+            if char != '[':
+                raise json.JSONDecodeError("Expecting '['", buf, pos)
+            pos += 1
+            state = 'first'
+        elif char == ']' and state in ('first', 'after'):
+            return
+        elif state == 'after':
+            if char != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+            pos += 1
+            state = 'value'
+        else:
+            # A value is only complete once something follows it (numbers have no end marker)
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                complete = end < len(buf) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = f.read(read_size)
+                read_size *= 2
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                continue
+            read_size = chunk_size
+            pos = end
+            state = 'after'
+            yield value
+
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+class BinarySnapshot:
+    """Compact snapshot layout: a header, a table block, then blocks of items.
+
+    The header is MAGIC, the format version, the block codec and the journal
+    seq. The table block holds the label dictionary and the values shared by
+    several items. Every following block holds up to SNAPSHOT_BLOCK_ITEMS
+    items, newest first, column by column: keys, kinds, titles, context
+    counts, label numbers, then each value's tag, text and shared-table
+    reference. A string column is one UTF-8 run plus the strings' lengths, so
+    a block decodes with a few calls instead of several per item. Blocks are
+    compressed one by one and read one at a time, so loading still streams.
+    An empty block ends the file.
+    """
+
+    MAGIC = b"CTSNAP"
+    VERSION = 1
+    HEADER = struct.Struct('>6sBBQ')
+    BLOCK = struct.Struct('>II')
+    SECTION = struct.Struct('>I')
+    CODECS = ('none', 'zlib', 'zstd')
+    KINDS = ('multi_context', 'simple', 'text')
+    # Value tags
+    NONE, TEXT, SHARED, BLOB, SEALED = range(5)
+
+    @classmethod
+    def write(cls, f, seq, items, shared_values, labels, codec=SNAPSHOT_CODEC):
+        """Write (key, item) pairs, newest first, as they are iterated.
+
+        shared_values are stored once; labels must hold every context label.
+        """
+        compress = cls._compressor(codec)
+        labels = {label: number for number, label in enumerate(labels)}
+        shared = {value: index for index, value in enumerate(shared_values)}
+
+        f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, cls.CODECS.index(codec), seq))
+        cls._write_block(f, compress, [*cls._strings(list(labels)), *cls._strings(shared_values)])
+        kind_codes = {kind: code for code, kind in enumerate(cls.KINDS)}
+        items = iter(items)
+        while True:
+            block = list(islice(items, SNAPSHOT_BLOCK_ITEMS))
+            if not block:
+                break
+            keys, kinds, counts, label_numbers = array('q'), bytearray(), array('I'), array('I')
+            title_lengths, titles = array('i'), []
+            tags, texts, refs, extras = bytearray(), [], array('I'), []
+
+            def add_value(value):
+                if value is None:
+                    tags.append(cls.NONE)
+                elif isinstance(value, BlobRef):
+                    tags.append(cls.BLOB)
+                    texts.append(value.preview)
+                    extras.append(f"{value.digest}:{value.size}")
+                elif isinstance(value, SealedValue):
+                    tags.append(cls.SEALED)
+                    texts.append(value.token)
+                elif value in shared:
+                    tags.append(cls.SHARED)
+                    refs.append(shared[value])
+                else:
+                    tags.append(cls.TEXT)
+                    texts.append(value)
+
+            for key, item in block:
+                keys.append(key)
+                kinds.append(kind_codes[item.kind])
+                if item.title is None:
+                    title_lengths.append(-1)
+                else:
+                    title_lengths.append(len(item.title))
+                    titles.append(item.title)
+                if item.kind == 'multi_context':
+                    counts.append(len(item.contexts))
+                    for context in item.contexts:
+                        label_numbers.append(labels[context.label])
+                        add_value(context.value)
+                else:
+                    counts.append(0)
+                    add_value(item.content)
+            cls._write_block(f, compress, [
+                cls._pack(keys), bytes(kinds), cls._pack(title_lengths), "".join(titles).encode('utf-8', 'surrogatepass'),
+                cls._pack(counts), cls._pack(label_numbers), bytes(tags), *cls._strings(texts),
+                cls._pack(refs), *cls._strings(extras),
+            ])
+        f.write(cls.BLOCK.pack(0, 0))
+
+    @classmethod
+    def read(cls, f):
+        """Return (seq, iterator of (key, item) pairs) for a file at its start.
+
+        The iterator reads the file lazily; raises ValueError on a damaged file.
+        """
+        seq, decompress, labels, shared = cls._read_tables(f)
+        return seq, cls._iter_items(f, decompress, labels, shared)
+
+    @classmethod
+    def scan(cls, f):
+        """Like read(), but iterating over (context labels, values) lists, one pair per block.
+
+        The values are those read() would give the items, without building
+        the items; a cheap pass for what is in the file.
+        """
+        seq, decompress, labels, shared = cls._read_tables(f)
+        return seq, ((block[5], block[6]) for block in cls._iter_blocks(f, decompress, labels, shared))
+
+    @classmethod
+    def _read_tables(cls, f):
+        header = f.read(cls.HEADER.size)
+        if len(header) < cls.HEADER.size:
+            raise ValueError("Truncated snapshot header")
+        magic, version, codec, seq = cls.HEADER.unpack(header)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a binary snapshot")
+        if version > cls.VERSION:
+            raise ValueError(f"Snapshot format version {version} is newer than this program")
+        if codec >= len(cls.CODECS):
+            raise ValueError(f"Unknown snapshot codec {codec}")
+        decompress = cls._decompressor(cls.CODECS[codec])
+        tables = cls._read_block(f, decompress)
+        if tables is None:
+            raise ValueError("Snapshot has no table block")
+        label_lengths, label_text, value_lengths, value_text = tables
+        labels = [sys.intern(label) for label in cls._split(cls._unpack('I', label_lengths), label_text)]
+        shared = cls._split(cls._unpack('I', value_lengths), value_text)
+        return seq, decompress, labels, shared
+
+    @classmethod
+    def _iter_items(cls, f, decompress, labels, shared):
+        kinds_by_code = cls.KINDS
+        for keys, kinds, title_lengths, titles, counts, context_labels, values in cls._iter_blocks(
+                f, decompress, labels, shared):
+            titles = iter(titles)
+            # Positions in values and context_labels
+            value_pos = label_pos = 0
+            for key, kind, title_length, count in zip(keys, kinds, title_lengths, counts):
+                title = next(titles) if title_length >= 0 else None
+                kind = kinds_by_code[kind]
+                if kind == 'multi_context':
+                    item = Item(kind, title, list(map(Context, context_labels[label_pos:label_pos + count],
+                                                      values[value_pos:value_pos + count])))
+                    value_pos += count
+                    label_pos += count
+                else:
+                    item = Item(kind, title, content=values[value_pos])
+                    value_pos += 1
+                yield key, item
+
+    @classmethod
+    def _iter_blocks(cls, f, decompress, labels, shared):
+        """Decoded columns of each block: keys, kinds, title lengths, titles, counts, context labels, values."""
+        while True:
+            sections = cls._read_block(f, decompress)
+            if sections is None:
+                return
+            (keys, kinds, title_lengths, title_text, counts, label_numbers,
+             tags, text_lengths, text, refs, extra_lengths, extra_text) = sections
+            title_lengths = cls._unpack('i', title_lengths)
+            titles = cls._split([length for length in title_lengths if length >= 0], title_text)
+            texts = cls._split(cls._unpack('I', text_lengths), text)
+            if tags.count(cls.TEXT) == len(tags):
+                values = texts
+            else:
+                values = cls._values(tags, texts, cls._unpack('I', refs),
+                                     cls._split(cls._unpack('I', extra_lengths), extra_text), shared)
+            context_labels = [labels[number] for number in cls._unpack('I', label_numbers)]
+            yield (cls._unpack('q', keys), kinds, title_lengths, titles, cls._unpack('I', counts),
+                   context_labels, values)
+
+    @classmethod
+    def _values(cls, tags, texts, refs, extras, shared):
+        texts, refs, extras = iter(texts), iter(refs), iter(extras)
+        values = []
+        for tag in tags:
+            if tag == cls.TEXT:
+                values.append(next(texts))
+            elif tag == cls.SHARED:
+                values.append(shared[next(refs)])
+            elif tag == cls.NONE:
+                values.append(None)
+            elif tag == cls.BLOB:
+                digest, _, size = next(extras).partition(':')
+                values.append(BlobRef(digest, int(size), next(texts)))
+            else:
+                values.append(SealedValue(next(texts)))
+        return values
+
+    @classmethod
+    def _write_block(cls, f, compress, sections):
+        raw = b"".join(cls.SECTION.pack(len(section)) + section for section in sections)
+        data = compress(raw)
+        f.write(cls.BLOCK.pack(len(data), len(raw)))
+        f.write(data)
+
+    @classmethod
+    def _read_block(cls, f, decompress):
+        """The next block's sections, or None at the end marker."""
+        header = f.read(cls.BLOCK.size)
+        if len(header) < cls.BLOCK.size:
+            raise ValueError("Truncated snapshot")
+        size, raw_size = cls.BLOCK.unpack(header)
+        if size == 0:
+            return None
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("Truncated snapshot")
+        raw = decompress(data, raw_size)
+        sections, pos = [], 0
+        while pos < len(raw):
+            (length,) = cls.SECTION.unpack_from(raw, pos)
+            pos += cls.SECTION.size
+            sections.append(raw[pos:pos + length])
+            pos += length
+        return sections
+
+    @classmethod
+    def _strings(cls, strings):
+        # Lengths in characters, so the decoded run can be sliced directly. Lone
+        # surrogates, which JSON and the journal accept, pass through as one character each.
+        return [cls._pack(array('I', map(len, strings))), "".join(strings).encode('utf-8', 'surrogatepass')]
+
+    @staticmethod
+    def _split(lengths, data):
+        text = data.decode('utf-8', 'surrogatepass')
+        offsets = list(accumulate(lengths, initial=0))
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    @staticmethod
+    def _pack(numbers):
+        # Little-endian on disk, whatever the machine
+        if sys.byteorder == 'big':
+            numbers = array(numbers.typecode, numbers)
+            numbers.byteswap()
+        return numbers.tobytes()
+
+    @staticmethod
+    def _unpack(typecode, data):
+        numbers = array(typecode)
+        numbers.frombytes(data)
+        if sys.byteorder == 'big':
+            numbers.byteswap()
+        return numbers
+
+    @staticmethod
+    def _compressor(codec):
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstd snapshots need the zstandard package")
+            return zstandard.ZstdCompressor(level=3).compress
+        if codec == 'zlib':
+            return lambda data: zlib.compress(data, 6)
+        if codec == 'none':
+            return bytes
+        raise ValueError(f"Unknown snapshot codec {codec!r}")
+
+    @staticmethod
+    def _decompressor(codec):
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("This snapshot is zstd compressed and needs the zstandard package")
+            decompressor = zstandard.ZstdDecompressor()
+            return lambda data, size: decompressor.decompress(data, max_output_size=size)
+        if codec == 'zlib':
+            return lambda data, size: zlib.decompress(data, bufsize=max(size, 1))
+        return lambda data, size: data
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared by every process using it.
+
+    Reentrant within a thread. Without fcntl (Windows) it only serializes the
+    threads of this process, so a store must not be opened twice there.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    def acquire(self, blocking=True):
+        if not self._lock.acquire(blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            if self._file is None:
+                self._file = open(self.path, 'a+b')
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                self._lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._depth == 0:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Storage:
+    """Interface shared by the storage backends behind load_data/save_data.
+
+    Items are addressed by integer keys that grow with insertion order.
+    """
+
+    def load(self):
+        """Return the saved items as a {key: item} dict in insertion order."""
+        return dict(sorted(self.iter_items()))
+
+    def iter_items(self):
+        """Yield (key, item) pairs newest first, reading lazily where possible."""
+        raise NotImplementedError
+
+    def apply_batch(self, ops):
+        """Persist a sequence of ('add', key, item), ('delete', key) and ('clear',) ops.
+
+        Each op is checked against what is saved at the time, including other
+        processes' writes. Adds that conflict are skipped and returned, the
+        rest are written: an add whose title a saved item already has, and the
+        add replacing an item another process deleted (a delete and an add of
+        the same key, where the delete found nothing).
+        """
+        raise NotImplementedError
+
+    def append_add(self, key, item):
+        self.apply_batch([('add', key, item)])
+
+    def append_delete(self, key):
+        self.apply_batch([('delete', key)])
+
+    def append_clear(self):
+        self.apply_batch([('clear',)])
+
+    def changes(self, known):
+        """Return the changes other processes made since the last call.
+
+        They come as the same ops apply_batch takes and are already persisted.
+        known is the caller's {key: item} view, for backends that keep none.
+        """
+        return []
+
+    def compact(self):
+        """Bring the on-disk state into its compact form."""
+
+    def blob_digests(self):
+        """Hex digests of the blob values the saved items refer to, or None if that is not known."""
+        return None
+
+    def close(self):
+        pass
+
+
+class ConflictError(RuntimeError):
+    """Ops apply_batch skipped because another process saved a conflicting change first."""
+
+    def __init__(self, ops):
+        self.ops = ops
+        titles = ", ".join(repr(op[2].display_title) for op in ops)
+        super().__init__(f"Another process changed the same items first; not saved: {titles}")
+
+
+class JournalStorage(Storage):
+    """Snapshot file plus an append-only journal of item mutations.
+
+    Each add, delete or clear is one fsync'd journal line, so the cost of a
+    change no longer depends on the store size. Once enough records pile up,
+    a background thread folds them into a new snapshot and empties the journal.
+    Only the keys, their titles and seq are kept in memory; the items
+    themselves live in the ItemStore, and compaction reads them back from
+    the files.
+
+    The snapshot is written as a BinarySnapshot by default. The JSON
+    snapshot is still read, and written when snapshot_format is 'json'. It is
+    a JSON array whose first element is a header and whose other elements
+    are [key, item] pairs, newest first, so it can be streamed one page at a
+    time. Values that occur in several items are written once, in the
+    header's "values" table, and referenced by index. Older stores keep theirs
+    in <base>.snapshot.json; the next compaction replaces it.
+
+    Several processes may share the files. Journal writes happen under an
+    flock on <base>.lock, after reading what the others appended, so the
+    records' seq numbers form one version sequence across all of them, and
+    a batch is checked for conflicts against everything before it there.
+    Compaction replaces the journal with a new file: a process that sees a
+    new journal inode and a snapshot newer than its own seq has missed
+    records and diffs the whole store against what it holds.
+    """
+
+    def __init__(self, data_file, compact_every=500, snapshot_format=SNAPSHOT_FORMAT):
+        base = os.path.splitext(data_file)[0]
+        self.legacy_file = data_file
+        self.snapshot_file = base + ".snapshot"
+        # Where stores written before the binary format keep their snapshot
+        self.json_snapshot_file = base + ".snapshot.json"
+        self.journal_file = base + ".journal"
+        self.lock_file = base + ".lock"
+        self.compact_every = compact_every
+        self.snapshot_format = snapshot_format
+
+        # Titles of the items the files hold by key, as far as read, and how many items have each
+        self._keys = {}
+        self._titles = Counter()
+        self._seq = 0
+        self._pending = 0
+        self._journal = None
+        self._compactor = None
+        self._loaded = False
+        self._generation = 0
+        # Inode of the journal file and how many of its bytes were applied
+        self._journal_id = None
+        self._offset = 0
+        # Snapshot keys deleted before the stream reached them
+        self._skip = set()
+        # Ops read from other processes' records, handed out by changes()
+        self._incoming = []
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._file_lock = FileLock(self.lock_file)
+
+    def iter_items(self):
+        with self._file_lock:
+            if not self.has_snapshot() and not os.path.exists(self.journal_file):
+                self._migrate_legacy()
+
+            with self._lock:
+                # Everything is read again, e.g. when a store is reloaded
+                self._keys.clear()
+                self._titles.clear()
+                self._skip.clear()
+                self._loaded = False
+                self._pending = 0
+                self._generation += 1
+                generation = self._generation
+            snapshot_file, snapshot_seq, snapshot_items = self._open_snapshot()
+            journal_items = {}
+            try:
+                cleared = self._replay_journal(snapshot_seq, journal_items)
+            except Exception:
+                if snapshot_file is not None:
+                    snapshot_file.close()
+                raise
+        try:
+            # Journal additions are newer than anything in the snapshot
+            with self._lock:
+                self._skip.update(journal_items)
+            for key in sorted(journal_items, reverse=True):
+                with self._lock:
+                    present = key in self._keys
+                if present:
+                    yield key, journal_items[key]
+
+            if not cleared:
+                for key, item in snapshot_items:
+                    with self._lock:
+                        if self._generation != generation:
+                            # Cleared or resynchronized while streaming; the rest is gone already
+                            return
+                        if key in self._skip:
+                            continue
+                        self._add_key(key, item.title)
+                    yield key, item
+            with self._lock:
+                self._loaded = True
+                self._skip.clear()
+        finally:
+            if snapshot_file is not None:
+                snapshot_file.close()
+
+    def apply_batch(self, ops):
+        return self._append(ops)
+
+    def changes(self, known):
+        # Only a stat while nothing changed, and never a wait on another
+        # process's write from the caller's (usually the UI) thread
+        if self._journal_state() != (self._journal_id, self._offset):
+            if self._file_lock.acquire(blocking=False):
+                try:
+                    self._catch_up()
+                finally:
+                    self._file_lock.release()
+        with self._lock:
+            ops, self._incoming = self._incoming, []
+        return ops
+
+    def compact(self):
+        """Write the current items as a new snapshot and drop the journal it covers."""
+        with self._compact_lock:
+            with self._file_lock:
+                self._catch_up()
+                seq, pairs, scan, source = self._read_state()
+
+            # Written without the file lock, so other processes can keep appending
+            try:
+                tmp_path = self._write_snapshot(seq, pairs, scan)
+            finally:
+                if source is not None:
+                    source.close()
+
+            with self._file_lock:
+                self._catch_up()
+                current = self._snapshot_seq()
+                if current > seq:
+                    # Another process compacted further meanwhile
+                    os.remove(tmp_path)
+                    seq = current
+                else:
+                    self._install(tmp_path)
+                with self._lock:
+                    # Records appended meanwhile stay; replay skips the ones the snapshot covers
+                    if self._seq == seq:
+                        self._reset_journal()
+                    self._pending = self._seq - seq
+
+    def blob_digests(self):
+        # Items the journal replaced count too, which only keeps a few blobs until a later collection
+        _, _, scan, source = self._read_state()
+        try:
+            return {value.digest for _, values in scan() for value in values if isinstance(value, BlobRef)}
+        finally:
+            if source is not None:
+                source.close()
+
+    def has_snapshot(self):
+        return self._snapshot_path() is not None
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        if self._pending:
+            self.compact()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._file_lock.close()
+
+    def _append(self, ops):
+        with self._file_lock:
+            # Other processes' records first, so seq stays one sequence and ops are checked against them
+            self._catch_up()
+            with self._lock:
+                if self._journal is None:
+                    self._journal = open(self.journal_file, 'a', encoding='utf-8')
+                    self._journal_id = os.fstat(self._journal.fileno()).st_ino
+                lines = []
+                rejected = []
+                gone = set()
+                for op in ops:
+                    if op[0] == 'add' and (op[1] in gone or self._titles[op[2].title] > 0):
+                        rejected.append(op)
+                        continue
+                    if op[0] == 'delete' and self._loaded and op[1] not in self._keys:
+                        gone.add(op[1])
+                    record = {'op': op[0]}
+                    if op[0] != 'clear':
+                        record['key'] = op[1]
+                    if op[0] == 'add':
+                        record['item'] = op[2]
+                    self._seq += 1
+                    record['seq'] = self._seq
+                    self._apply(record)
+                    lines.append(json.dumps(record, default=Item.to_json) + "\n")
+                # One write and one fsync for the whole batch
+                data = "".join(lines)
+                self._journal.write(data)
+                self._fsync(self._journal)
+                tracer.count('bytes_written', len(data))
+                self._offset = os.fstat(self._journal.fileno()).st_size
+                self._pending += len(lines)
+                if self._pending >= self.compact_every and not self._compacting():
+                    self._compactor = threading.Thread(target=self.compact, daemon=True)
+                    self._compactor.start()
+        return rejected
+
+    def _compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def _catch_up(self):
+        """Apply the records other processes appended since we last looked. Needs the file lock."""
+        journal_id, size = self._journal_state()
+        if journal_id != self._journal_id:
+            # Replaced by a compaction, whose snapshot holds what the old journal did
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._snapshot_seq() > self._seq:
+                self._resync()
+                return
+            self._journal_id, self._offset = journal_id, 0
+        if size <= self._offset:
+            return
+        for record in self._read_journal():
+            with self._lock:
+                if record.get('seq', 0) <= self._seq:
+                    continue
+                self._seq = record['seq']
+                self._pending += 1
+                self._incoming.append(self._apply(record))
+
+    def _resync(self):
+        """Diff the whole store against what we hold, after missing compacted records."""
+        with self._lock:
+            known = set(self._keys)
+        keys = set()
+        added = {}
+        snapshot_file, snapshot_seq, snapshot_items = self._open_snapshot()
+        try:
+            for key, item in snapshot_items:
+                keys.add(key)
+                if key not in known:
+                    added[key] = item
+        finally:
+            if snapshot_file is not None:
+                snapshot_file.close()
+
+        seq = snapshot_seq
+        pending = 0
+        self._journal_id, self._offset = self._journal_state()[0], 0
+        if self._journal_id is not None:
+            for record in self._read_journal():
+                if record.get('seq', 0) <= snapshot_seq:
+                    continue
+                op = record.get('op')
+                if op == 'add':
+                    keys.add(record['key'])
+                    if record['key'] not in known:
+                        added[record['key']] = Item.from_json(record['item'])
+                elif op == 'delete':
+                    keys.discard(record['key'])
+                    added.pop(record['key'], None)
+                elif op == 'clear':
+                    keys.clear()
+                    added.clear()
+                seq = record['seq']
+                pending += 1
+
+        with self._lock:
+            records = [{'op': 'delete', 'key': key} for key in known if key not in keys]
+            records += [{'op': 'add', 'key': key, 'item': item} for key, item in sorted(added.items())]
+            self._incoming.extend(self._apply(record) for record in records)
+            self._seq = seq
+            self._pending = pending
+            # A stream in progress stops; its remaining items came as adds
+            self._generation += 1
+            self._loaded = True
+            self._skip.clear()
+
+    def _apply(self, record):
+        """Apply one record to the items in memory and return it as an op."""
+        op = record.get('op')
+        if op == 'add':
+            item = Item.from_json(record['item'])
+            self._add_key(record['key'], item.title)
+            return ('add', record['key'], item)
+        elif op == 'delete':
+            if record['key'] in self._keys:
+                self._remove_key(record['key'])
+            elif not self._loaded:
+                self._skip.add(record['key'])
+            return ('delete', record['key'])
+        elif op == 'clear':
+            self._keys.clear()
+            self._titles.clear()
+            self._generation += 1
+            self._loaded = True
+            return ('clear',)
+
+    def _add_key(self, key, title):
+        if key in self._keys:
+            self._remove_key(key)
+        self._keys[key] = title
+        if title is not None:
+            self._titles[title] += 1
+
+    def _remove_key(self, key):
+        title = self._keys.pop(key)
+        if title is not None:
+            self._titles[title] -= 1
+            if not self._titles[title]:
+                del self._titles[title]
+
+    def _migrate_legacy(self):
+        loaded_items = read_legacy_items(self.legacy_file)
+        if loaded_items is not None:
+            # The legacy file is left in place as a backup
+            items = [(key, Item.from_json(item)) for key, item in enumerate(loaded_items, start=1)]
+            items.reverse()
+            self._install(self._write_snapshot(0, lambda: iter(items)))
+
+    def _snapshot_path(self):
+        for path in (self.snapshot_file, self.json_snapshot_file):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _open_snapshot(self, source=None):
+        """(open file or None, seq, iterator of (key, item) pairs), whatever the snapshot's format.
+
+        source is an open snapshot file to read again from its start, even
+        if another snapshot has replaced it since.
+        """
+        if source is not None:
+            f = open(os.dup(source.fileno()), 'rb')
+            f.seek(0)
+        else:
+            path = self._snapshot_path()
+            if path is None:
+                return None, 0, iter(())
+            f = open(path, 'rb')
+        try:
+            if f.read(len(BinarySnapshot.MAGIC)) == BinarySnapshot.MAGIC:
+                f.seek(0)
+                seq, items = BinarySnapshot.read(f)
+                return f, seq, items
+            f.seek(0)
+            f = io.TextIOWrapper(f, encoding='utf-8')
+            if f.read(1) == '{':
+                # Version 1 snapshots are one object with items oldest first
+                f.seek(0)
+                snapshot = json.load(f)
+                f.close()
+                pairs = reversed(snapshot.get('items', []))
+                return None, snapshot.get('seq', 0), ((key, Item.from_json(item)) for key, item in pairs)
+            f.seek(0)
+            elements = iter_json_array(f)
+            header = next(elements)
+        except Exception:
+            f.close()
+            raise
+        shared = header.get('values', [])
+        return f, header.get('seq', 0), ((key, Item.from_json(item, shared)) for key, item in elements)
+
+    def _snapshot_seq(self):
+        snapshot_file, seq, _ = self._open_snapshot()
+        if snapshot_file is not None:
+            snapshot_file.close()
+        return seq
+
+    def _journal_state(self):
+        """(inode, size) of the journal file, or (None, 0) when there is none."""
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def _replay_journal(self, snapshot_seq, items):
+        """Apply journal records newer than the snapshot; returns whether one cleared the store.
+
+        The items they leave are put in items. Snapshot keys the journal
+        deleted go to _skip, since the snapshot itself has not been read at
+        this point.
+        """
+        cleared = False
+        self._seq = snapshot_seq
+        self._journal_id, self._offset = self._journal_state()[0], 0
+        if self._journal_id is None:
+            return cleared
+
+        for record in self._read_journal():
+            if record.get('seq', 0) <= snapshot_seq:
+                continue
+            with self._lock:
+                op = self._apply(record)
+            if record.get('op') == 'add':
+                items[record['key']] = op[2]
+            elif record.get('op') == 'delete':
+                items.pop(record['key'], None)
+            elif record.get('op') == 'clear':
+                cleared = True
+                items.clear()
+            self._seq = record['seq']
+            self._pending += 1
+        return cleared
+
+    def _read_state(self):
+        """(seq, pairs, scan, source) for what the snapshot and journal hold.
+
+        pairs() streams the (key, item) pairs newest first, reading the files
+        again on every call, so no pass holds the whole store. scan() is the
+        cheaper pass _write_snapshot takes: (labels, values) lists covering
+        those items, plus the ones the journal replaced. Both go on reading
+        the snapshot of the time through source, the open snapshot file (None
+        without one), until the caller closes it.
+        """
+        with self._file_lock:
+            path = self._snapshot_path()
+            source = open(path, 'rb') if path is not None else None
+            try:
+                snapshot_file, seq, _ = self._open_snapshot(source) if source is not None else (None, 0, None)
+                if snapshot_file is not None:
+                    snapshot_file.close()
+                # The journal is short next to the snapshot: what it left, and the snapshot keys it replaced
+                journal_items = {}
+                replaced = set()
+                cleared = False
+                if os.path.exists(self.journal_file):
+                    with open(self.journal_file, 'rb') as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line) if line.endswith(b"\n") else None
+                            except ValueError:
+                                record = None
+                            if record is None:
+                                break
+                            if record.get('seq', 0) <= seq:
+                                continue
+                            op = record.get('op')
+                            if op == 'add':
+                                journal_items[record['key']] = Item.from_json(record['item'])
+                                replaced.add(record['key'])
+                            elif op == 'delete':
+                                journal_items.pop(record['key'], None)
+                                replaced.add(record['key'])
+                            elif op == 'clear':
+                                journal_items.clear()
+                                cleared = True
+                            seq = record['seq']
+            except BaseException:
+                if source is not None:
+                    source.close()
+                raise
+        journal_items = sorted(journal_items.items(), reverse=True)
+
+        def pairs():
+            if cleared or source is None:
+                yield from journal_items
+                return
+            snapshot_file, _, snapshot_items = self._open_snapshot(source)
+            try:
+                snapshot_items = (pair for pair in snapshot_items if pair[0] not in replaced)
+                yield from heapq.merge(journal_items, snapshot_items, key=lambda pair: -pair[0])
+            finally:
+                if snapshot_file is not None:
+                    snapshot_file.close()
+
+        def scan():
+            for _, item in journal_items:
+                yield [context.label for context in item.contexts], item.values()
+            if cleared or source is None:
+                return
+            # A duplicate shares the file position, so one pass at a time
+            with open(os.dup(source.fileno()), 'rb') as f:
+                f.seek(0)
+                binary = f.read(len(BinarySnapshot.MAGIC)) == BinarySnapshot.MAGIC
+                if binary:
+                    f.seek(0)
+                    yield from BinarySnapshot.scan(f)[1]
+            if not binary:
+                # JSON snapshots have no cheaper pass than reading the items
+                snapshot_file, _, snapshot_items = self._open_snapshot(source)
+                try:
+                    for _, item in snapshot_items:
+                        yield [context.label for context in item.contexts], item.values()
+                finally:
+                    if snapshot_file is not None:
+                        snapshot_file.close()
+        return seq, pairs, scan, source
+
+    def _read_journal(self):
+        """Yield the journal records past _offset and advance it. Needs the file lock."""
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    # Torn write from a crash; everything after it is dropped
+                    break
+                self._offset += len(line)
+                yield record
+        if self._offset < os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(self._offset)
+
+    def _reset_journal(self):
+        # A new file rather than a truncation, so other processes notice by the inode
+        tmp_path = f"{self.journal_file}.{os.getpid()}.tmp"
+        open(tmp_path, 'wb').close()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        os.replace(tmp_path, self.journal_file)
+        self._journal_id, self._offset = self._journal_state()[0], 0
+
+    def _write_snapshot(self, seq, pairs, scan=None):
+        """Write a snapshot next to the current one and return its path, for _install().
+
+        pairs() returns the (key, item) pairs to write, newest first. The
+        labels and shared values are found first, by scan() if given: an
+        iterator of (labels, values) lists covering at least those items.
+        """
+        if scan is None:
+            scan = lambda: (([context.label for context in item.contexts], item.values()) for _, item in pairs())
+        counts = Counter()
+        labels = {}
+        for block_labels, values in scan():
+            labels.update(dict.fromkeys(block_labels))
+            counts.update(value for value in values if isinstance(value, str) and len(value) >= SHARED_MIN_CHARS)
+        values = [value for value, count in counts.items() if count > 1]
+
+        # Unique per writer, since several processes may compact at once
+        tmp_path = f"{self.snapshot_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.snapshot_format == 'binary':
+                with open(tmp_path, 'wb') as f:
+                    BinarySnapshot.write(f, seq, pairs(), values, list(labels))
+                    self._fsync(f)
+                    tracer.count('bytes_written', f.tell())
+                return tmp_path
+            shared = {value: index for index, value in enumerate(values)}
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("[" + json.dumps({'version': 3, 'seq': seq, 'values': values}))
+                for key, item in pairs():
+                    f.write(",\n" + json.dumps([key, item.to_json(shared)], separators=(',', ':')))
+                f.write("]\n")
+                self._fsync(f)
+                tracer.count('bytes_written', f.tell())
+            return tmp_path
+        except BaseException:
+            # A failed compaction leaves the current snapshot as it was, and no partial file
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _install(self, tmp_path):
+        os.replace(tmp_path, self.snapshot_file)
+        # The new snapshot supersedes one in the old location
+        if os.path.exists(self.json_snapshot_file):
+            os.remove(self.json_snapshot_file)
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_file)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    @staticmethod
+    def _fsync(f):
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class SQLiteStorage(Storage):
+    """Items and their contexts in normalized SQLite tables.
+
+    Titles are indexed (and unique for multi-context items), so title lookups,
+    duplicate checks and deletes take index time. get() and iter_page() read
+    single items or pages without loading the whole store into memory.
+    Values of SHARED_MIN_CHARS or more live once in shared_values, keyed by
+    hash and reference counted by the rows pointing at them.
+
+    Every write also goes to the changes table, tagged with the writing
+    connection's origin. Other processes sharing the database notice a
+    commit through PRAGMA data_version and read the rows past their last
+    seen seq; one that fell behind the pruned log diffs the keys instead.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            key INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            title TEXT,
+            content TEXT
+        );
+        CREATE INDEX IF NOT EXISTS items_title ON items(title);
+        CREATE UNIQUE INDEX IF NOT EXISTS items_title_unique
+            ON items(title) WHERE type = 'multi_context';
+        CREATE TABLE IF NOT EXISTS contexts (
+            item_key INTEGER NOT NULL REFERENCES items(key),
+            position INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (item_key, position)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS shared_values (
+            id INTEGER PRIMARY KEY,
+            hash BLOB NOT NULL UNIQUE,
+            text TEXT NOT NULL,
+            refs INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            op TEXT NOT NULL,
+            key INTEGER
+        );
+    """
+    # Added later. *_blob: "digest:size" of a blob value, whose preview is then
+    # in value/content. *_id: a shared_values row holding the value instead.
+    # *_sealed: the token of an encrypted value.
+    ADDED_COLUMNS = (
+        ('items', 'content_blob', 'TEXT'),
+        ('contexts', 'value_blob', 'TEXT'),
+        ('items', 'content_id', 'INTEGER'),
+        ('contexts', 'value_id', 'INTEGER'),
+        ('items', 'content_sealed', 'TEXT'),
+        ('contexts', 'value_sealed', 'TEXT'),
+    )
+    ITEM_COLUMNS = """key, type, title, COALESCE(s.text, content), content_blob, content_sealed
+        FROM items LEFT JOIN shared_values s ON s.id = content_id"""
+    CONTEXT_COLUMNS = """item_key, label, COALESCE(s.text, value), value_blob, value_sealed
+        FROM contexts LEFT JOIN shared_values s ON s.id = value_id"""
+    # Rows of the changes table kept for processes that have not caught up
+    CHANGES_KEPT = 10000
+    # Milliseconds an opening process waits for another one's schema setup and migration
+    SETUP_TIMEOUT = 600000
+
+    def __init__(self, data_file):
+        self.legacy_file = data_file
+        self.db_file = os.path.splitext(data_file)[0] + ".db"
+        self._conn = None
+        self._origin = os.urandom(8).hex()
+        # Last changes row and data_version seen
+        self._seen = 0
+        self._data_version = None
+        # Reads come from the UI thread, writes from the persistence worker
+        self._lock = threading.RLock()
+
+    def load(self):
+        self._open()
+        items = {}
+        with self._lock:
+            item_rows = self._conn.execute(f"SELECT {self.ITEM_COLUMNS} ORDER BY key")
+            context_rows = self._conn.execute(f"SELECT {self.CONTEXT_COLUMNS} ORDER BY item_key, position")
+            for key, item in self._build_items(item_rows, context_rows):
+                items[key] = item
+        return items
+
+    def iter_items(self):
+        self._open()
+        page = self.iter_page(limit=LOAD_PAGE_SIZE)
+        while page:
+            yield from page
+            page = self.iter_page(page[-1][0], LOAD_PAGE_SIZE)
+
+    def apply_batch(self, ops):
+        self._open()
+        rejected = []
+        written = []
+        gone = set()
+        with self._lock, self._conn:
+            # Taking the write lock before reading, so the checks still hold when the batch commits
+            self._conn.execute("BEGIN IMMEDIATE")
+            for op in ops:
+                if op[0] == 'add':
+                    if op[1] in gone or self._title_taken(op[2].title):
+                        rejected.append(op)
+                        continue
+                    self._insert(op[1], op[2])
+                elif op[0] == 'delete':
+                    self._release_values(op[1])
+                    self._conn.execute("DELETE FROM contexts WHERE item_key = ?", (op[1],))
+                    if not self._conn.execute("DELETE FROM items WHERE key = ?", (op[1],)).rowcount:
+                        gone.add(op[1])
+                elif op[0] == 'clear':
+                    self._conn.execute("DELETE FROM contexts")
+                    self._conn.execute("DELETE FROM items")
+                    self._conn.execute("DELETE FROM shared_values")
+                written.append(op)
+            self._conn.executemany(
+                "INSERT INTO changes (origin, op, key) VALUES (?, ?, ?)",
+                [(self._origin, op[0], op[1] if len(op) > 1 else None) for op in written]
+            )
+            self._conn.execute("DELETE FROM shared_values WHERE refs <= 0")
+            self._conn.execute(
+                "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (self.CHANGES_KEPT,)
+            )
+        return rejected
+
+    def get(self, key):
+        self._open()
+        page = self._select("WHERE key = ?", (key,))
+        return page[0][1] if page else None
+
+    def changes(self, known):
+        self._open()
+        with self._lock:
+            # Only commits by other connections move data_version
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return []
+            self._data_version = version
+            oldest, latest = self._conn.execute("SELECT MIN(seq), MAX(seq) FROM changes").fetchone()
+            if latest is None or latest <= self._seen:
+                return []
+            seen, self._seen = self._seen, latest
+            if oldest > seen + 1:
+                return self._diff(known)
+            rows = self._conn.execute(
+                "SELECT op, key FROM changes WHERE seq > ? AND seq <= ? AND origin != ? ORDER BY seq",
+                (seen, latest, self._origin)
+            ).fetchall()
+        ops = []
+        for op, key in rows:
+            if op == 'add':
+                item = self.get(key)
+                if item is not None:
+                    ops.append(('add', key, item))
+            elif op == 'delete':
+                ops.append(('delete', key))
+            else:
+                ops.append(('clear',))
+        return ops
+
+    def iter_page(self, before_key=None, limit=100):
+        """Return up to limit (key, item) pairs older than before_key, newest first."""
+        self._open()
+        if before_key is None:
+            return self._select("ORDER BY key DESC LIMIT ?", (limit,))
+        return self._select("WHERE key < ? ORDER BY key DESC LIMIT ?", (before_key, limit))
+
+    def compact(self):
+        self._open()
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def blob_digests(self):
+        self._open()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content_blob FROM items WHERE content_blob IS NOT NULL "
+                "UNION SELECT value_blob FROM contexts WHERE value_blob IS NOT NULL"
+            ).fetchall()
+        return {blob.split(':', 1)[0] for blob, in rows}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _open(self):
+        with self._lock:
+            if self._conn is not None:
+                return
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            timeout = self._conn.execute("PRAGMA busy_timeout").fetchone()[0]
+            self._conn.execute(f"PRAGMA busy_timeout = {self.SETUP_TIMEOUT}")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Deleted rows are zeroed, so values rewritten by seal_all leave no plaintext behind
+            self._conn.execute("PRAGMA secure_delete=ON")
+            # One transaction, so processes opening a new database together create and fill it once
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                fresh = self._conn.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'items'"
+                ).fetchone()[0] == 0
+                for statement in self.SCHEMA.split(';'):
+                    if statement.strip():
+                        self._conn.execute(statement)
+                for table, column, kind in self.ADDED_COLUMNS:
+                    columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+                    if column not in columns:
+                        self._add_column(table, column, kind)
+                if fresh:
+                    self._migrate()
+            self._conn.execute(f"PRAGMA busy_timeout = {timeout}")
+            self._seen = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _add_column(self, table, column, kind):
+        try:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        except sqlite3.OperationalError as e:
+            # Added by an older version that set up the schema without a transaction
+            if "duplicate column" not in str(e):
+                raise
+
+    def _migrate(self):
+        # Pick up whatever the journal backend or the original JSON file holds, inside _open's transaction
+        source = JournalStorage(self.legacy_file)
+        try:
+            if source.has_snapshot() or os.path.exists(source.journal_file):
+                # Replayed, so a journal that was never compacted is carried over too
+                items = source.iter_items()
+            else:
+                items = enumerate((Item.from_json(item) for item in read_legacy_items(self.legacy_file) or []),
+                                  start=1)
+            for key, item in items:
+                self._insert(key, item)
+        finally:
+            source.close()
+
+    def _diff(self, known):
+        # The log no longer reaches back to what we saw; compare keys instead
+        keys = {row[0] for row in self._conn.execute("SELECT key FROM items")}
+        ops = [('delete', key) for key in known if key not in keys]
+        ops += [('add', key, self.get(key)) for key in sorted(keys.difference(known))]
+        return ops
+
+    def _title_taken(self, title):
+        return title is not None and self._conn.execute(
+            "SELECT 1 FROM items WHERE title = ? LIMIT 1", (title,)
+        ).fetchone() is not None
+
+    def _insert(self, key, item):
+        self._conn.execute(
+            "INSERT INTO items (key, type, title, content, content_blob, content_id, content_sealed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, item.kind, item.title, *self._value_columns(item.content))
+        )
+        if item.contexts:
+            self._conn.executemany(
+                "INSERT INTO contexts (item_key, position, label, value, value_blob, value_id, value_sealed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(key, i, ctx.label, *self._value_columns(ctx.value)) for i, ctx in enumerate(item.contexts)]
+            )
+
+    def _value_columns(self, value):
+        """(text, blob, shared id, sealed) columns for a value."""
+        if isinstance(value, BlobRef):
+            return value.preview, f"{value.digest}:{value.size}", None, None
+        if isinstance(value, SealedValue):
+            return '', None, None, value.token
+        if value is None or len(value) < SHARED_MIN_CHARS:
+            return value, None, None, None
+        digest = hashlib.sha256(value.encode('utf-8')).digest()
+        self._conn.execute(
+            "INSERT INTO shared_values (hash, text, refs) VALUES (?, ?, 1) "
+            "ON CONFLICT(hash) DO UPDATE SET refs = refs + 1",
+            (digest, value)
+        )
+        row = self._conn.execute("SELECT id FROM shared_values WHERE hash = ?", (digest,)).fetchone()
+        return '', None, row[0], None
+
+    def _release_values(self, key):
+        ids = self._conn.execute(
+            "SELECT value_id FROM contexts WHERE item_key = ? AND value_id IS NOT NULL "
+            "UNION ALL SELECT content_id FROM items WHERE key = ? AND content_id IS NOT NULL",
+            (key, key)
+        ).fetchall()
+        self._conn.executemany("UPDATE shared_values SET refs = refs - 1 WHERE id = ?", ids)
+
+    @staticmethod
+    def _value(text, blob, sealed=None):
+        if sealed is not None:
+            return SealedValue(sealed)
+        if blob is None:
+            return text
+        digest, size = blob.split(':')
+        return BlobRef(digest, int(size), text)
+
+    def _select(self, clause, params):
+        with self._lock:
+            item_rows = self._conn.execute(
+                f"SELECT {self.ITEM_COLUMNS} {clause}", params
+            ).fetchall()
+            keys = [row[0] for row in item_rows]
+            context_rows = []
+            if keys:
+                placeholders = ",".join("?" * len(keys))
+                context_rows = self._conn.execute(
+                    f"SELECT {self.CONTEXT_COLUMNS} WHERE item_key IN ({placeholders}) "
+                    "ORDER BY item_key, position",
+                    keys
+                ).fetchall()
+        contexts = {}
+        for item_key, label, value, blob, sealed in context_rows:
+            contexts.setdefault(item_key, []).append(Context(label, self._value(value, blob, sealed)))
+        return [(row[0], self._build_item(row, contexts.get(row[0], []))) for row in item_rows]
+
+    def _build_items(self, item_rows, context_rows):
+        # Both cursors are ordered by key, so contexts are merged in one pass
+        pending = next(context_rows, None)
+        for row in item_rows:
+            contexts = []
+            while pending is not None and pending[0] == row[0]:
+                contexts.append(Context(pending[1], self._value(*pending[2:])))
+                pending = next(context_rows, None)
+            yield row[0], self._build_item(row, contexts)
+
+    @classmethod
+    def _build_item(cls, row, contexts):
+        key, kind, title, content, content_blob, content_sealed = row
+        return Item(kind, title, contexts, cls._value(content, content_blob, content_sealed))
+
+
+class SearchIndex:
+    """Hashed trigram index for substring search over items.
+
+    Each item gets a slot number, and each of its trigrams adds the slot to
+    one of BUCKETS posting arrays, chosen by the trigram's hash. Postings are
+    sorted array('I') runs, a few bytes per entry, rather than sets of keys.
+    A query word of three or more characters narrows the candidates to the
+    slots in its smallest bucket, intersected with the other small ones; the
+    candidates are then checked with a plain substring test, which also
+    drops trigrams that merely share a bucket. Shorter queries fall back to
+    scanning the cached item texts. Only the first INDEXED_CHARS of an item
+    are indexed; longer items are always treated as candidates. A removed
+    item's slot stays in the postings until dead slots outnumber live ones
+    and everything is reindexed.
+
+    add() only keeps the item's text. Its trigrams are indexed by
+    index_pending(), which the window calls from idle time after loading, or
+    by the next search at the latest, so loading doesn't pay for the index.
+    """
+
+    INDEXED_CHARS = 512
+    BUCKETS = 1 << 16
+    # Postings this many times larger than the candidates left aren't worth intersecting
+    INTERSECT_RATIO = 8
+    GRAMS = re.compile(r'(?=(.{3}))', re.S)
+
+    def __init__(self):
+        self._texts = {}
+        self._long_keys = set()
+        self.clear()
+
+    @property
+    def pending(self):
+        """How many items are waiting to be indexed."""
+        return len(self._pending)
+
+    def add(self, key, item):
+        if key in self._texts:
+            self.remove(key)
+        text = item.search_text()
+        self._texts[key] = text
+        if len(text) > self.INDEXED_CHARS:
+            self._long_keys.add(key)
+        self._pending[key] = None
+
+    def remove(self, key):
+        if self._texts.pop(key, None) is None:
+            return
+        self._long_keys.discard(key)
+        if self._pending.pop(key, 0) is None:
+            return
+        self._keys[self._slots.pop(key)] = None
+        self._dead += 1
+        if self._dead > len(self._slots):
+            self._reindex()
+
+    def index_pending(self, limit=None):
+        """Index up to limit waiting items (all for None); returns whether any are left."""
+        pending, texts = self._pending, self._texts
+        for key in list(islice(pending, limit)):
+            del pending[key]
+            self._index(key, texts[key])
+        return bool(pending)
+
+    def clear(self):
+        self._texts.clear()
+        self._long_keys.clear()
+        # Keys added but not indexed yet, oldest first
+        self._pending = {}
+        self._buckets = [None] * self.BUCKETS
+        # Key of each slot, None once removed
+        self._keys = []
+        self._slots = {}
+        self._dead = 0
+
+    def search(self, query):
+        """Return the keys whose text contains every word of the query."""
+        words = query.lower().split()
+        if not words:
+            return set(self._texts)
+
+        texts = self._texts
+        indexed = [word for word in words if len(word) >= 3]
+        if not indexed:
+            candidates = texts.keys()
+        else:
+            self.index_pending()
+            # Per word: trigrams spanning the gap between words need not occur anywhere
+            buckets = set().union(*map(self._bucket_numbers, indexed))
+            postings = sorted((self._buckets[bucket] or () for bucket in buckets), key=len)
+            slots = set(postings[0])
+            for posting in postings[1:]:
+                if not slots or len(posting) > len(slots) * self.INTERSECT_RATIO:
+                    break
+                slots.intersection_update(posting)
+            candidates = set(map(self._keys.__getitem__, slots))
+            candidates.discard(None)
+            candidates.update(self._long_keys)
+
+        # Trigrams sharing a bucket, and words' trigrams out of order, are weeded out here
+        for word in words:
+            candidates = {key for key in candidates if word in texts[key]}
+        return set(candidates)
+
+    def matches(self, key, query):
+        text = self._texts.get(key, "")
+        return all(word in text for word in query.lower().split())
+
+    def _index(self, key, text):
+        slot = self._slots[key] = len(self._keys)
+        self._keys.append(key)
+        buckets = self._buckets
+        for bucket in self._bucket_numbers(text[:self.INDEXED_CHARS]):
+            posting = buckets[bucket]
+            if posting is None:
+                buckets[bucket] = array('I', (slot,))
+            else:
+                posting.append(slot)
+
+    def _reindex(self):
+        texts, long_keys = dict(self._texts), set(self._long_keys)
+        self.clear()
+        self._texts.update(texts)
+        self._long_keys.update(long_keys)
+        # Indexed again lazily, like freshly added items
+        self._pending = dict.fromkeys(texts)
+
+    @classmethod
+    def _bucket_numbers(cls, text):
+        # All in C: the trigrams, their hashes and their buckets
+        return set(map((cls.BUCKETS - 1).__and__, map(hash, cls.GRAMS.findall(text))))
+
+
+class FuzzyMatcher:
+    """Ranks items and single contexts against a fuzzy query for the launcher.
+
+    Candidate strings are built once per item and cached, so a keystroke only
+    re-scores them; when the query extends the previous one, only the previous
+    matches are looked at. Newer items get a small recency bonus, and a boost
+    function can add points per (key, label), e.g. for frequent copies.
+    """
+
+    RECENCY_WEIGHT = 10
+
+    def __init__(self):
+        self._by_key = {}
+        self._candidates = None
+        self._last_query = None
+        self._last_matches = None
+
+    def add(self, key, item):
+        self._by_key[key] = self._build(key, item)
+        self._invalidate()
+
+    def remove(self, key):
+        if self._by_key.pop(key, None) is not None:
+            self._invalidate()
+
+    def clear(self):
+        self._by_key.clear()
+        self._invalidate()
+
+    def search(self, query, limit=50, boost=None):
+        """Return up to limit (display, value, key, label) tuples, best match first.
+
+        label is None for a whole item. boost(key, label) gives extra points.
+        """
+        if self._candidates is None:
+            self._candidates = [c for candidates in self._by_key.values() for c in candidates]
+        if boost is None:
+            boost = lambda key, label: 0
+        needle = "".join(query.lower().split())
+        if not needle:
+            # Boosted candidates first, then the newest
+            newest = heapq.nlargest(limit, self._candidates, key=lambda c: (boost(c[3], c[4]), c[3]))
+            return [c[1:] for c in newest]
+
+        # Matches only shrink as the query grows, so narrow the previous result
+        pool = self._candidates
+        if self._last_query and needle.startswith(self._last_query):
+            pool = self._last_matches
+        pattern = re.compile(".*?".join(map(re.escape, needle)), re.DOTALL)
+
+        search = pattern.search
+        matches = [candidate for candidate in pool if search(candidate[0])]
+        self._last_query, self._last_matches = needle, matches
+
+        # Contiguous matches always outscore scattered ones, so when there are
+        # enough of them the scattered ones need not be scored at all
+        contiguous = [candidate for candidate in matches if needle in candidate[0]]
+        if len(contiguous) >= limit:
+            matches = contiguous
+        matches = [(candidate, search(candidate[0])) for candidate in matches]
+
+        score = self._score
+        # Keys are timestamps for items added since stores became shareable,
+        # so the bonus grows from the oldest key rather than from zero
+        oldest, newest = min(self._by_key, default=0), max(self._by_key, default=0)
+        recency = self.RECENCY_WEIGHT / ((newest - oldest) or 1)
+        best = heapq.nlargest(
+            limit, matches,
+            key=lambda pair: (score(needle, pair[0][0], pair[1]) + recency * (pair[0][3] - oldest)
+                              + boost(pair[0][3], pair[0][4]))
+        )
+        return [c[1:] for c, _ in best]
+
+    def _invalidate(self):
+        self._candidates = None
+        self._last_query = self._last_matches = None
+
+    @staticmethod
+    def _score(needle, haystack, match):
+        start, end = match.span()
+        # Tight spans score high; contiguous and word-start matches score higher
+        score = 100.0 * len(needle) / (end - start)
+        if needle in haystack:
+            score += 50
+        if start == 0 or not haystack[start - 1].isalnum():
+            score += 20
+        return score - min(start, 20) * 0.5
+
+    @staticmethod
+    def _build(key, item):
+        # (haystack, display, value, key, label) per copyable thing in the item
+        # Values may be Items or BlobRefs; ItemStore.resolve turns them into text
+        title = item.display_title
+        if item.kind == 'multi_context':
+            candidates = [(title.lower(), f"{title}  (all)", item, key, None)]
+            for ctx in item.contexts:
+                candidates.append((f"{title} {ctx.label}".lower(), f"{title} › {ctx.label}", ctx.value, key, ctx.label))
+            return candidates
+        content = item.content or ''
+        preview = str(content)[:60].replace("\n", " ")
+        return [(f"{title} {preview}".lower(), f"{title} › {preview}", content, key, None)]
+
+
+class PersistenceWorker:
+    """Writes storage mutations from a background thread.
+
+    Changes submitted within `delay` seconds of each other are coalesced into
+    one apply_batch call, so a burst of clicks costs a single disk write and
+    the UI thread never waits on I/O. Failures are reported through `errors`;
+    adds the storage skipped as conflicts also go to `rejected`, for the
+    ItemStore to drop them again. A 'usage' op saves `usage`, once per batch
+    however many were submitted.
+    Values put in `blobs` are written along with the batch that refers to them,
+    and a compaction ends by collecting the blobs nothing refers to anymore.
+    """
+
+    MAX_BATCH = 1000
+    MAX_WAIT = 2.0
+
+    def __init__(self, storage, delay=SAVE_DELAY, usage=None, blobs=None):
+        self.storage = storage
+        self.delay = delay
+        self.usage = usage
+        self.blobs = blobs
+        self.errors = queue.Queue()
+        self.rejected = queue.Queue()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+
+    def submit(self, *op):
+        self._queue.put(op)
+
+    def submit_many(self, ops):
+        """Queue several ops that are written together in one apply_batch call."""
+        self._queue.put(('batch', ops))
+
+    def compact(self, keep=frozenset()):
+        """Queue a compaction; blobs whose digest is in keep survive it even if unreferenced."""
+        self._queue.put(('compact', keep))
+
+    def flush(self):
+        """Block until everything submitted so far is on disk."""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        done.wait()
+
+    def close(self):
+        """Write what is pending, close the storage and stop the thread."""
+        self._queue.put(('close',))
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.MAX_WAIT
+            # Debounce: keep collecting until the queue has been quiet for `delay`
+            while batch[-1][0] not in ('flush', 'close') and len(batch) < self.MAX_BATCH:
+                timeout = min(self.delay, deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            ops = []
+            for op in batch:
+                if op[0] == 'batch':
+                    ops.extend(op[1])
+                elif op[0] in ('add', 'delete', 'clear'):
+                    ops.append(op)
+            if ops:
+                self._call('save.batch', self._apply, ops)
+            if self.usage is not None and any(op[0] in ('usage', 'close') for op in batch):
+                self._call('save.usage', self.usage.save)
+            for op in batch:
+                if op[0] == 'compact':
+                    self._call('save.compact', self.storage.compact)
+                    if self.blobs is not None:
+                        self._call('save.collect', self._collect, op[1])
+                elif op[0] == 'flush':
+                    op[1].set()
+                elif op[0] == 'close':
+                    self._call('save.close', self.storage.close)
+                    return
+
+    def _apply(self, ops):
+        refs = [value for op in ops if op[0] == 'add' for value in op[2].values() if isinstance(value, BlobRef)]
+        if self.blobs is None or not refs:
+            rejected = self.storage.apply_batch(ops)
+        else:
+            # Under the blob lock throughout, so no collection sees the blobs without the records
+            with self.blobs.lock:
+                self.blobs.write(refs)
+                rejected = self.storage.apply_batch(ops)
+        if rejected:
+            for op in rejected:
+                self.rejected.put(op)
+            raise ConflictError(rejected)
+
+    def _collect(self, keep):
+        if not os.path.exists(self.blobs.path):
+            return
+        with self.blobs.lock:
+            live = self.storage.blob_digests()
+            if live is not None:
+                self.blobs.collect(live | keep)
+
+    def _call(self, name, method, *args):
+        try:
+            with tracer.span(name, ops=len(args[0]) if args else 0):
+                method(*args)
+        except Exception as e:
+            print(f"Error saving data: {e}")
+            self.errors.put(e)
+
+
+class BlobStore:
+    """Append-only file of large values keyed by SHA-256, read through mmap.
+
+    Each record is the 32-byte digest, an 8-byte length and the UTF-8 data.
+    Identical values are stored once. put() only hashes a value and keeps it
+    in memory; the persistence worker appends it with write(), one fsync per
+    batch, together with the journal entries that refer to it. Writers hold
+    `lock`, an flock on <path>.lock, and a lookup that misses first reads
+    the records other processes appended since the last one.
+
+    collect() rewrites the file without the values nothing refers to, once
+    they fill half of it. A process that finds the file replaced keeps the
+    old ones mapped, so values it still holds stay readable, and write()
+    appends them again when e.g. undo brings back an item referring to one.
+    """
+
+    HEADER = struct.Struct('>32sQ')
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+        self._index = {}
+        self._file = None
+        self._map = None
+        # Bytes of the file whose headers are in _index
+        self._scanned = 0
+        # digest -> data put but not written yet
+        self._pending = {}
+        # (map, index) of each file a collection replaced
+        self._retired = []
+        self._lock = threading.Lock()
+
+    def put(self, text):
+        """Return text's BlobRef; the value is written by write() along with the item."""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).digest()
+        with self._lock:
+            if digest not in self._index:
+                self._pending.setdefault(digest, data)
+        return BlobRef(digest.hex(), len(data), text[:PREVIEW_CHARS])
+
+    def get(self, ref):
+        """Read a value back; only the mapped pages it spans are touched."""
+        digest = bytes.fromhex(ref.digest)
+        with self._lock:
+            data = self._read(digest)
+        if data is None:
+            with self.lock, self._lock:
+                self._open()
+                self._scan()
+                data = self._read(digest)
+        if data is None:
+            raise KeyError(f"Blob {ref.digest} is missing from {self.path}")
+        return data.decode('utf-8')
+
+    def write(self, refs):
+        """Make sure the file holds the values of these BlobRefs. Runs on the persistence worker.
+
+        Only values the file lacks are appended, from put() or from a file
+        a collection replaced. The caller holds `lock` until the records
+        referring to them are written, so collect() can't drop them first.
+        """
+        digests = {bytes.fromhex(ref.digest) for ref in refs}
+        if not digests:
+            return
+        with self.lock:
+            with self._lock:
+                self._open()
+                self._scan()
+                records = {}
+                for digest in digests:
+                    if digest not in self._index:
+                        data = self._read(digest)
+                        if data is not None:
+                            records[digest] = bytes(data)
+            # Written without _lock, so lookups of values on disk don't wait for the fsync
+            offset = self._scanned
+            locations = {}
+            chunks = []
+            for digest, data in records.items():
+                chunks += [self.HEADER.pack(digest, len(data)), data]
+                locations[digest] = (offset + self.HEADER.size, len(data))
+                offset += self.HEADER.size + len(data)
+            if chunks:
+                self._file.seek(0, os.SEEK_END)
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                tracer.count('bytes_written', offset - self._scanned)
+            with self._lock:
+                self._index.update(locations)
+                self._scanned = offset
+                for digest in digests:
+                    self._pending.pop(digest, None)
+
+    def collect(self, live):
+        """Rewrite the file with only the values whose hex digest is in live; returns the bytes dropped.
+
+        Nothing is rewritten while the unreferenced values fill less than
+        half the file. Callers hold `lock` from before they work out live,
+        so no value can be written and referenced in between.
+        """
+        with self.lock, self._lock:
+            self._open()
+            self._scan()
+            dead = sum(self.HEADER.size + length for digest, (_, length) in self._index.items()
+                       if digest.hex() not in live)
+            if not dead or dead * 2 < self._scanned:
+                return 0
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for digest in self._index:
+                        if digest.hex() in live:
+                            data = self._read(digest)
+                            f.write(self.HEADER.pack(digest, len(data)))
+                            f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            self._retire()
+            return dead
+
+    def close(self):
+        with self._lock:
+            for retired_map, _ in self._retired:
+                retired_map.close()
+            self._retired = []
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.lock.close()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a+b')
+
+    def _read(self, digest):
+        """Data of a value from memory, the file or the file it replaced; None if unknown. Needs _lock."""
+        data = self._pending.get(digest)
+        if data is not None:
+            return data
+        location = self._index.get(digest)
+        if location is not None:
+            offset, length = location
+            if self._map is None or len(self._map) < offset + length:
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map[offset:offset + length]
+        for retired_map, index in reversed(self._retired):
+            if digest in index:
+                offset, length = index[digest]
+                return retired_map[offset:offset + length]
+        return None
+
+    def _scan(self):
+        """Index the records appended since the last scan. Needs both locks."""
+        if os.fstat(self._file.fileno()).st_ino != os.stat(self.path).st_ino:
+            # Another process collected; what we had indexed is in the old file
+            self._retire()
+            self._open()
+        # Only the headers are read; the data is skipped over
+        offset = self._scanned
+        size = os.path.getsize(self.path)
+        while offset + self.HEADER.size <= size:
+            self._file.seek(offset)
+            digest, length = self.HEADER.unpack(self._file.read(self.HEADER.size))
+            if offset + self.HEADER.size + length > size:
+                break
+            self._index[digest] = (offset + self.HEADER.size, length)
+            offset += self.HEADER.size + length
+        if offset < size:
+            # Torn write from a crash
+            self._file.truncate(offset)
+        self._scanned = offset
+
+    def _retire(self):
+        """Swap the replaced file for the new one, keeping the old mapped. Needs _lock."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._index:
+            self._retired.append((mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ), self._index))
+        self._file.close()
+        self._file = None
+        self._index = {}
+        self._scanned = 0
+
+
+class PassphraseError(ValueError):
+    """Raised when an encrypted store is opened without its passphrase, or with a wrong one."""
+
+
+def key_file_path(data_file):
+    """Where an encrypted store keeps its key derivation parameters."""
+    return os.path.splitext(os.path.abspath(data_file))[0] + ".key"
+
+
+class Vault:
+    """Encrypts single values with AES-GCM under a key derived once per session.
+
+    The key comes from the passphrase through scrypt. Its salt and cost, and
+    a sealed check value that catches a wrong passphrase up front, are kept
+    in the key file. Every value gets a fresh nonce, so equal values don't
+    look equal on disk, and only the values actually read are decrypted.
+
+    A value sealed with an item key and label has them as associated data,
+    so its token fails to open once moved to another item or context. Such
+    tokens start with BOUND_PREFIX; older ones without it open unbound.
+    """
+
+    SCRYPT_COST = {'n': 2 ** 15, 'r': 8, 'p': 1}
+    NONCE_BYTES = 12
+    CHECK_TEXT = "copy-thingy"
+    BOUND_PREFIX = "bound:"
+
+    def __init__(self, key_file, passphrase):
+        if AESGCM is None:
+            raise RuntimeError("Encryption needs the cryptography package")
+        self.key_file = key_file
+        params = self._read_params()
+        if params is None:
+            params = dict(self.SCRYPT_COST, salt=base64.b64encode(os.urandom(16)).decode('ascii'))
+            self._aead = AESGCM(self._derive(passphrase, params))
+            params['check'] = self.seal(self.CHECK_TEXT).token
+            if self._write_params(params):
+                return
+            # Another process created the key file first; its salt wins
+            params = self._read_params()
+        self._aead = AESGCM(self._derive(passphrase, params))
+        try:
+            if self.open(SealedValue(params['check'])) != self.CHECK_TEXT:
+                raise ValueError
+        except ValueError:
+            raise PassphraseError("Wrong passphrase") from None
+
+    def seal(self, text, key=None, label=None):
+        """Encrypt text, bound to the item key and context label it is stored under if key is given."""
+        nonce = os.urandom(self.NONCE_BYTES)
+        aad = None if key is None else self._aad(key, label)
+        data = nonce + self._aead.encrypt(nonce, text.encode('utf-8'), aad)
+        token = base64.b64encode(data).decode('ascii')
+        return SealedValue(token if aad is None else self.BOUND_PREFIX + token)
+
+    def open(self, sealed, key=None, label=None):
+        """Decrypt a SealedValue stored under key and label; raises ValueError if it was tampered with or moved."""
+        token, aad = sealed.token, None
+        if self.is_bound(sealed):
+            token, aad = token[len(self.BOUND_PREFIX):], self._aad(key, label)
+        data = base64.b64decode(token)
+        try:
+            plain = self._aead.decrypt(data[:self.NONCE_BYTES], data[self.NONCE_BYTES:], aad)
+        except InvalidTag:
+            raise ValueError("An encrypted value failed authentication") from None
+        return plain.decode('utf-8')
+
+    @classmethod
+    def is_bound(cls, value):
+        """Whether value is a SealedValue bound to its item key and label."""
+        return isinstance(value, SealedValue) and value.token.startswith(cls.BOUND_PREFIX)
+
+    @staticmethod
+    def _aad(key, label):
+        return json.dumps([key, label]).encode('utf-8')
+
+    @staticmethod
+    def _derive(passphrase, params):
+        # scrypt needs 128 * n * r bytes, over OpenSSL's default limit
+        return hashlib.scrypt(
+            passphrase.encode('utf-8'), salt=base64.b64decode(params['salt']),
+            n=params['n'], r=params['r'], p=params['p'], maxmem=256 * 1024 * 1024, dklen=32
+        )
+
+    def _read_params(self):
+        try:
+            with open(self.key_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_params(self, params):
+        """Create the key file; returns False if it exists already."""
+        tmp_path = f"{self.key_file}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(params, f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # Unlike a rename, a link never replaces a key file made meanwhile
+            os.link(tmp_path, self.key_file)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+        return True
+
+
+STORAGE_BACKENDS = {
+    'journal': JournalStorage,
+    'sqlite': SQLiteStorage,
+}
+
+
+class HistoryEntry:
+    """One captured clipboard text."""
+
+    __slots__ = ('key', 'text', 'digest', 'size', 'captured_at')
+
+    def __init__(self, key, text, digest, size, captured_at):
+        self.key = key
+        self.text = text
+        self.digest = digest
+        self.size = size
+        self.captured_at = captured_at
+
+
+class ClipboardHistory:
+    """Bounded in-memory history of clipboard texts, oldest evicted first.
+
+    Holds at most max_entries entries and max_bytes of UTF-8 text. A text
+    equal to the previous capture (compared by hash) is not recorded again.
+    """
+
+    def __init__(self, max_entries=HISTORY_ENTRIES, max_bytes=HISTORY_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Insertion ordered, so the first key is always the oldest entry
+        self.entries = {}
+        self.total_bytes = 0
+        self._last_digest = None
+        self._next_key = 1
+
+    def capture(self, text, now=None):
+        """Record text if it is new; returns (entry or None, evicted keys)."""
+        if not text:
+            return None, []
+        data = text.encode('utf-8')
+        # blake2b is the cheapest hashlib digest; this runs once per new clipboard text
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if digest == self._last_digest or len(data) > self.max_bytes:
+            return None, []
+        self._last_digest = digest
+
+        entry = HistoryEntry(self._next_key, text, digest, len(data), time.time() if now is None else now)
+        self._next_key += 1
+        self.entries[entry.key] = entry
+        self.total_bytes += entry.size
+
+        evicted = []
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            evicted.append(self.remove(next(iter(self.entries))).key)
+        return entry, evicted
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def keys(self, query=""):
+        """Keys newest first, limited to entries containing every word of query."""
+        words = query.lower().split()
+        return [
+            key for key in reversed(self.entries)
+            if all(word in self.entries[key].text.lower() for word in words)
+        ]
+
+
+class UsageStats:
+    """Copy counts per item and per context label, with a frecency score.
+
+    An item's score counts its copies, each weighing half as much for every
+    USAGE_HALF_LIFE seconds of age, so items copied often and lately rank
+    first. Only the score at the last copy is kept and decayed when read.
+    record() touches memory only. save() merges the changes into the usage
+    file under the store's lock, so copies made by other processes add up.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, lock_path):
+        self.path = path
+        # key -> {'count', 'score', 'stamp', 'contexts': {label: count}}
+        self.entries = {}
+        # Changes since the last save: deltas in the same form, forgotten keys
+        self._changed = {}
+        self._forgotten = set()
+        self._cleared = False
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(lock_path)
+        try:
+            self.entries = self._read()
+        except (OSError, ValueError) as e:
+            print(f"Error reading usage data: {e}")
+
+    def record(self, key, label=None, now=None):
+        """Count one copy of an item, or of one of its contexts."""
+        use = self._entry(time.time() if now is None else now, count=1, score=1.0)
+        if label is not None:
+            use['contexts'][label] = 1
+        with self._lock:
+            for table in (self.entries, self._changed):
+                self._merge(table.setdefault(key, self._entry(use['stamp'])), use)
+
+    def forget(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+            self._changed.pop(key, None)
+            self._forgotten.add(key)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._changed.clear()
+            self._forgotten.clear()
+            self._cleared = True
+
+    def count(self, key, label=None):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return 0
+            return entry['count'] if label is None else entry['contexts'].get(label, 0)
+
+    def score(self, key, now=None):
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return 0.0
+        return self._decay(entry['score'], (time.time() if now is None else now) - entry['stamp'])
+
+    def scores(self, now=None):
+        """{(key, label): score} with each item's score split by what its copies took.
+
+        label None stands for copies of the whole item.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = [(key, entry['count'], self._decay(entry['score'], now - entry['stamp']),
+                        dict(entry['contexts'])) for key, entry in self.entries.items()]
+        scores = {}
+        for key, count, score, contexts in entries:
+            scores[(key, None)] = score * (count - sum(contexts.values())) / count
+            for label, copies in contexts.items():
+                scores[(key, label)] = score * copies / count
+        return scores
+
+    def hot(self, limit=HOT_ITEMS, min_score=HOT_MIN_SCORE):
+        """Keys scoring at least min_score, best first."""
+        now = time.time()
+        with self._lock:
+            keys = list(self.entries)
+        scored = [(self.score(key, now), key) for key in keys]
+        return [key for score, key in heapq.nlargest(limit, scored) if score >= min_score]
+
+    def save(self):
+        """Merge the changes since the last save into the usage file."""
+        with self._lock:
+            if not (self._changed or self._forgotten or self._cleared):
+                return
+            changed, forgotten, cleared = self._changed, self._forgotten, self._cleared
+            self._changed, self._forgotten, self._cleared = {}, set(), False
+        with self._file_lock:
+            entries = {} if cleared else self._read()
+            for key in forgotten:
+                entries.pop(key, None)
+            for key, delta in changed.items():
+                self._merge(entries.setdefault(key, self._entry(delta['stamp'])), delta)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'items': {str(key): entry for key, entry in entries.items()}}, f)
+                tracer.count('bytes_written', f.tell())
+            os.replace(tmp_path, self.path)
+        with self._lock:
+            # Take in the other processes' copies, keeping ours made while writing
+            for key in self._forgotten:
+                entries.pop(key, None)
+            for key, delta in self._changed.items():
+                self._merge(entries.setdefault(key, self._entry(delta['stamp'])), delta)
+            self.entries = entries
+
+    def close(self):
+        self._file_lock.close()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {int(key): entry for key, entry in data.get('items', {}).items()}
+
+    @staticmethod
+    def _entry(stamp, count=0, score=0.0):
+        return {'count': count, 'score': score, 'stamp': stamp, 'contexts': {}}
+
+    @classmethod
+    def _merge(cls, entry, delta):
+        stamp = max(entry['stamp'], delta['stamp'])
+        entry['score'] = (cls._decay(entry['score'], stamp - entry['stamp'])
+                          + cls._decay(delta['score'], stamp - delta['stamp']))
+        entry['stamp'] = stamp
+        entry['count'] += delta['count']
+        contexts = entry['contexts']
+        for label, count in delta['contexts'].items():
+            contexts[label] = contexts.get(label, 0) + count
+
+    @staticmethod
+    def _decay(score, age):
+        return score * 0.5 ** (max(age, 0) / USAGE_HALF_LIFE)
+
+
+class Version:
+    """One step of the store's history: its changes and the version it was made from."""
+
+    __slots__ = ('number', 'parent', 'children', 'changes', 'description', 'created', 'redo')
+
+    def __init__(self, number, parent, changes, description, created):
+        self.number = number
+        self.parent = parent
+        self.children = []
+        # (key, item before, item after) triples; None where there was no item
+        self.changes = changes
+        self.description = description
+        self.created = created
+        # The child redo() returns to
+        self.redo = None
+
+
+class VersionLog:
+    """Undo/redo over the store's changes, kept as a tree of versions.
+
+    A version holds only its own changes, as (key, before, after) triples of
+    the store's Item objects, and points at the version it was made from. So
+    versions share everything before they diverge, and keeping hundreds of
+    them costs memory in proportion to the changes, not to copies of the
+    items. Making a change after an undo starts a branch; the older branch
+    can still be restored by number. The oldest versions beyond `limit` are
+    dropped along with the branches that no longer lead to the current one.
+    """
+
+    def __init__(self, limit=VERSIONS_KEPT):
+        self.limit = limit
+        self.current = self.root = Version(0, None, (), "Opened", time.time())
+        self.versions = {0: self.root}
+        self._next_number = 1
+
+    def record(self, changes, description):
+        if not changes:
+            return
+        version = Version(self._next_number, self.current, tuple(changes), description, time.time())
+        self._next_number += 1
+        self.current.children.append(version)
+        self.current.redo = version
+        self.versions[version.number] = version
+        self.current = version
+        while len(self.versions) > self.limit:
+            self._drop_root()
+
+    def states(self, target):
+        """{key: item or None} that turns the current version's items into target's."""
+        ancestors = set()
+        version = self.current
+        while version is not None:
+            ancestors.add(version)
+            version = version.parent
+        forward = []
+        base = target
+        while base not in ancestors:
+            forward.append(base)
+            base = base.parent
+
+        states = {}
+        # Back up to the common ancestor; the earliest change's before wins
+        version = self.current
+        while version is not base:
+            for key, before, _ in reversed(version.changes):
+                states[key] = before
+            version = version.parent
+        for version in reversed(forward):
+            for key, _, after in version.changes:
+                states[key] = after
+        return states
+
+    def move_to(self, target):
+        """Make target current, remembering the way back for redo()."""
+        version = target
+        while version.parent is not None and version.parent.redo is not version:
+            version.parent.redo = version
+            version = version.parent
+        self.current = target
+
+    def history(self):
+        """Versions oldest first."""
+        return [self.versions[number] for number in sorted(self.versions)]
+
+    def _drop_root(self):
+        # The child on the way to the current version becomes the root; other branches go
+        keep = self.current
+        while keep.parent is not self.root:
+            keep = keep.parent
+        for child in self.root.children:
+            if child is not keep:
+                self._forget(child)
+        del self.versions[self.root.number]
+        keep.parent = None
+        self.root = keep
+
+    def _forget(self, version):
+        stack = [version]
+        while stack:
+            version = stack.pop()
+            del self.versions[version.number]
+            stack.extend(version.children)
+
+
+class DuplicateTitleError(ValueError):
+    """Raised when adding an item whose title is already taken."""
+
+
+class ItemStore:
+    """Items by key plus their indexes and persistence, usable without a display.
+
+    Keys grow with insertion order, so sorting them newest first gives the
+    display order. Loading is incremental: start_loading() then load_page()
+    until `loading` is False, or load_all() for scripts. Mutations are applied
+    in memory at once and written by the persistence worker.
+
+    Several processes may open the same data file; sync() applies what the
+    others changed. New keys are microsecond timestamps, so keys allocated by
+    different processes don't collide and still sort by insertion time.
+
+    Given a passphrase, or when the data file has a key file, the store is
+    encrypted: values are written as SealedValues and only decrypted by
+    resolve(). Titles and labels stay readable, so listing and search work
+    without decrypting anything, but values can't be searched.
+
+    Adds, deletes and clears made through the store are versions in
+    `versions`, for undo(), redo() and restore(). Changes synced from other
+    processes are not; the log lives as long as the store is open.
+    """
+
+    def __init__(self, data_file="clipboard_data.json", backend='journal', save_delay=SAVE_DELAY,
+                 passphrase=None):
+        # Absolute, so every process and a later chdir all mean the same files
+        self.data_file = data_file = os.path.abspath(data_file)
+        self.vault = None
+        if passphrase is not None or os.path.exists(key_file_path(data_file)):
+            if passphrase is None:
+                raise PassphraseError("The store is encrypted and needs its passphrase")
+            self.vault = Vault(key_file_path(data_file), passphrase)
+        base = os.path.splitext(data_file)[0]
+        self.storage = STORAGE_BACKENDS[backend](data_file)
+        self.usage = UsageStats(base + ".usage.json", base + ".lock")
+        self.blobs = BlobStore(base + ".blobs")
+        self.persistence = PersistenceWorker(self.storage, save_delay, self.usage, self.blobs)
+        self.values = ValuePool()
+        self.items = {}
+        self.search_index = SearchIndex()
+        self.fuzzy_matcher = FuzzyMatcher()
+        self._titles = {}
+        self._next_key = 1
+        self._loader = None
+        # (key, label) -> text, least recently copied first
+        self._hot_values = OrderedDict()
+        self.versions = VersionLog()
+
+    @property
+    def loading(self):
+        return self._loader is not None
+
+    def start_loading(self):
+        self.items.clear()
+        self._clear_indexes()
+        self.versions = VersionLog()
+        self._next_key = 1
+        self._loader = self.storage.iter_items()
+
+    def load_page(self, limit=LOAD_PAGE_SIZE):
+        """Read up to limit more items (all of them for None); return their keys, newest first."""
+        if self._loader is None:
+            return []
+        keys = []
+        # Items that arrived through sync() first are read but not returned
+        read = 0
+        try:
+            with tracer.span('load.page') as span:
+                for key, item in islice(self._loader, limit):
+                    read += 1
+                    if key in self.items:
+                        # Already arrived through sync()
+                        continue
+                    item.share_values(self.values)
+                    self.items[key] = item
+                    self._index_item(key, item)
+                    self._next_key = max(self._next_key, key + 1)
+                    keys.append(key)
+                span.set(items=len(keys))
+        except json.JSONDecodeError:
+            print("Error decoding saved data. Keeping the items read so far.")
+            self._loader = None
+        except Exception:
+            self._loader = None
+            raise
+        if limit is None or read < limit:
+            self._loader = None
+        return keys
+
+    def finish_loading(self):
+        return self.load_page(None)
+
+    def stop_loading(self):
+        if self._loader is not None:
+            self._loader.close()
+            self._loader = None
+
+    def load_all(self):
+        self.start_loading()
+        return self.finish_loading()
+
+    def get(self, key):
+        return self.items.get(key)
+
+    def find_title(self, title):
+        """Return the key of the newest item with this title, or None."""
+        self.finish_loading()
+        keys = self._titles.get(title)
+        return max(keys) if keys else None
+
+    def has_title(self, title):
+        self.finish_loading()
+        return bool(self._titles.get(title))
+
+    def keys(self):
+        """All loaded keys, newest first."""
+        return sorted(self.items, reverse=True)
+
+    def hot_keys(self, limit=HOT_ITEMS):
+        """Keys of the most copied items by frecency, best first; some may not be loaded yet."""
+        return self.usage.hot(limit)
+
+    def search(self, query):
+        """Keys of the items matching every word of the query, newest first."""
+        with tracer.span('search'):
+            return sorted(self.search_index.search(query), reverse=True)
+
+    def index_pending(self, limit=INDEX_BATCH):
+        """Index up to limit more loaded items for search; returns whether any are left.
+
+        Searches index whatever is left themselves; calling this from idle
+        time keeps that work off the first keystroke.
+        """
+        if not self.search_index.pending:
+            return False
+        with tracer.span('search.index'):
+            return self.search_index.index_pending(limit)
+
+    def matches(self, key, query):
+        return self.search_index.matches(key, query)
+
+    def fuzzy(self, query, limit=50):
+        """Launcher matches; frequently copied items and contexts rank higher."""
+        with tracer.span('search.fuzzy'):
+            scores = self.usage.scores()
+            boost = None
+            if scores:
+                boost = lambda key, label: USAGE_WEIGHT * min(scores.get((key, label), 0), USAGE_BOOST_MAX)
+            return self.fuzzy_matcher.search(query, limit, boost)
+
+    def sync(self):
+        """Apply the adds, deletes and clears other processes made; returns those ops.
+
+        Items whose add the storage rejected as a conflict are dropped again
+        and come back as deletes. Cheap enough for a timer: without changes
+        it is a stat or a pragma.
+        """
+        applied = []
+        while True:
+            try:
+                op = self.persistence.rejected.get_nowait()
+            except queue.Empty:
+                break
+            # Unless it was deleted or replaced here meanwhile
+            if self.items.get(op[1]) is op[2]:
+                self._remove(op[1])
+                self.usage.forget(op[1])
+                applied.append(('delete', op[1]))
+        for op in self.storage.changes(self.items):
+            if op[0] == 'add':
+                key, item = op[1], op[2]
+                if key in self.items:
+                    continue
+                item.share_values(self.values)
+                self.items[key] = item
+                self._index_item(key, item)
+                self._next_key = max(self._next_key, key + 1)
+            elif op[0] == 'delete':
+                if self._remove(op[1]) is None:
+                    continue
+                self.usage.forget(op[1])
+            else:
+                self.stop_loading()
+                self.items.clear()
+                self._clear_indexes()
+                self.usage.clear()
+            applied.append(op)
+        return applied
+
+    def resolve(self, value, key=None, label=None):
+        """Full text of a value: reads BlobRefs back, decrypts SealedValues and expands whole Items.
+
+        key and label say where the value is stored; SealedValues only open there.
+        """
+        if isinstance(value, BlobRef):
+            with tracer.span('copy.blob_read', size=value.size):
+                return self.blobs.get(value)
+        if isinstance(value, SealedValue):
+            if self.vault is None:
+                raise PassphraseError("The store's key file is missing")
+            with tracer.span('copy.decrypt'):
+                return self.vault.open(value, key, label)
+        if isinstance(value, Item):
+            return value.copy_text(resolve=lambda value, label: self.resolve(value, key, label))
+        return value
+
+    def resolve_item(self, key):
+        """The item with every value read back or decrypted, e.g. for an export."""
+        return self.items[key].map_contexts(lambda label, value: self.resolve(value, key, label))
+
+    def copy_text(self, key, label=None):
+        """Full text an item, or one of its contexts, copies; None if there is no such thing.
+
+        Texts of values copied often are kept resolved, so copying them again
+        reads no blob and joins no contexts. Encrypted stores keep none.
+        """
+        cached = self._hot_values.get((key, label))
+        if cached is not None:
+            self._hot_values.move_to_end((key, label))
+            return cached
+        item = self.items.get(key)
+        text = item.copy_text(label, lambda value, label: self.resolve(value, key, label)) if item is not None else None
+        if text is not None and self.vault is None and self.usage.count(key, label) >= HOT_VALUE_COPIES:
+            self._hot_values[(key, label)] = text
+            if len(self._hot_values) > HOT_VALUES:
+                self._hot_values.popitem(last=False)
+        return text
+
+    def record_copy(self, key, label=None):
+        """Count a copy of the item, or of its context with this label; saved in batches."""
+        if key in self.items:
+            self.usage.record(key, label)
+            self.persistence.submit('usage')
+
+    def _store_value(self, value, key, label):
+        if self.vault is not None and isinstance(value, str):
+            # Not moved to the blob file, whose hashes would show which values are equal
+            return self.vault.seal(value, key, label)
+        if isinstance(value, str) and len(value) > BLOB_THRESHOLD:
+            return self.blobs.put(value)
+        return value
+
+    def add(self, item):
+        """Store a new Item, or anything Item.from_json accepts, and return its key."""
+        item = Item.from_json(item)
+        if item.title is not None and self.has_title(item.title):
+            raise DuplicateTitleError(f"An item titled {item.title!r} already exists")
+        key, item = self._insert(item)
+        self.persistence.submit('add', key, item)
+        self.versions.record([(key, None, item)], f"Added {item.display_title}")
+        return key
+
+    def add_many(self, items, batch_size=IMPORT_BATCH):
+        """Add items from an iterable, skipping duplicate titles; returns (added, skipped).
+
+        Titles are checked against the store and the items before them in one
+        pass, and each batch of batch_size items is a single storage write.
+        """
+        self.finish_loading()
+        added = skipped = 0
+        ops = []
+        changes = []
+        for item in items:
+            item = Item.from_json(item)
+            if item.title is not None and self._titles.get(item.title):
+                skipped += 1
+                continue
+            key, item = self._insert(item)
+            ops.append(('add', key, item))
+            changes.append((key, None, item))
+            added += 1
+            if len(ops) >= batch_size:
+                self.persistence.submit_many(ops)
+                ops = []
+        if ops:
+            self.persistence.submit_many(ops)
+        self.versions.record(changes, f"Imported {added} items")
+        return added, skipped
+
+    def _insert(self, item):
+        # Large values go to the blob file; the item keeps a reference and a preview
+        key = max(self._next_key, time.time_ns() // 1000)
+        self._next_key = key + 1
+        item = item.map_contexts(lambda label, value: self.values.acquire(self._store_value(value, key, label)))
+        self.items[key] = item
+        self._index_item(key, item)
+        return key, item
+
+    def seal_all(self, batch_size=IMPORT_BATCH):
+        """Encrypt the values stored before encryption was turned on; returns how many items changed.
+
+        Values encrypted before they were bound to their key and label are
+        encrypted again, bound.
+
+        Each item is rewritten under its own key. The old plaintext is gone
+        from the snapshot or database after the next compaction, and from
+        the blob file once a compaction rewrites it, but not from a legacy
+        clipboard_data.json.
+        """
+        if self.vault is None:
+            raise PassphraseError("The store has no passphrase")
+        self.finish_loading()
+        changed = 0
+        ops = []
+        for key, item in list(self.items.items()):
+            if all(self.vault.is_bound(value) for value in item.values()):
+                continue
+            # Values sealed before they were bound to their key and label are sealed again
+            sealed = item.map_contexts(
+                lambda label, value: value if self.vault.is_bound(value)
+                else self.vault.seal(self.resolve(value, key, label), key, label)
+            )
+            self._remove(key)
+            self.items[key] = sealed
+            self._index_item(key, sealed)
+            ops += [('delete', key), ('add', key, sealed)]
+            changed += 1
+            if len(ops) >= batch_size:
+                self.persistence.submit_many(ops)
+                ops = []
+        if ops:
+            self.persistence.submit_many(ops)
+        # Undoing must not bring the plaintext items back
+        self.versions = VersionLog()
+        return changed
+
+    def delete(self, key):
+        """Remove an item; returns it, or None if the key is unknown."""
+        item = self._remove(key)
+        if item is not None:
+            self.usage.forget(key)
+            self.persistence.submit('delete', key)
+            self.persistence.submit('usage')
+            self.versions.record([(key, item, None)], f"Deleted {item.display_title}")
+        return item
+
+    def clear(self):
+        # Loaded in full first, so undo can bring every item back
+        self.finish_loading()
+        self.versions.record([(key, item, None) for key, item in self.items.items()],
+                             f"Cleared {len(self.items)} items")
+        self.items.clear()
+        self._clear_indexes()
+        self.usage.clear()
+        self.persistence.submit('clear')
+        self.persistence.submit('usage')
+
+    def undo(self):
+        """Go back one version; returns the ops applied, like sync(), or None at the oldest."""
+        target = self.versions.current.parent
+        return None if target is None else self.restore(target.number)
+
+    def redo(self):
+        """Go forward again after undo(); returns the ops applied, or None if there is nothing to redo."""
+        target = self.versions.current.redo
+        return None if target is None else self.restore(target.number)
+
+    def restore(self, number):
+        """Bring the items to how they were at version number; returns the ops applied, like sync().
+
+        Only items that differ are touched. If an item coming back has a
+        title another item took since, DuplicateTitleError is raised and
+        nothing changes.
+        """
+        target = self.versions.versions.get(number)
+        if target is None:
+            raise KeyError(f"No version {number}")
+        self.finish_loading()
+        changed = {key: item for key, item in self.versions.states(target).items() if self.items.get(key) is not item}
+
+        def title_at(key):
+            item = changed[key] if key in changed else self.items.get(key)
+            return item.title if item is not None else None
+        for key, item in changed.items():
+            if item is not None and item.title is not None and any(
+                    other != key and title_at(other) == item.title for other in self._titles.get(item.title, ())):
+                raise DuplicateTitleError(f"Can't bring back {item.title!r}: another item has that title now")
+
+        # Deletes first, so an item and the one replacing it never share a title
+        ops = []
+        for key in changed:
+            if self._remove(key) is not None:
+                ops.append(('delete', key))
+        for key, item in changed.items():
+            if item is not None:
+                item.share_values(self.values)
+                self.items[key] = item
+                self._index_item(key, item)
+                self._next_key = max(self._next_key, key + 1)
+                ops.append(('add', key, item))
+        if ops:
+            self.persistence.submit_many(ops)
+        self.versions.move_to(target)
+        return ops
+
+    def compact(self):
+        """Ask the persistence worker to compact the store; returns immediately.
+
+        Loaded items with inline values over BLOB_THRESHOLD, e.g. from before
+        the blob file, get them moved out of line first. Blobs referenced only
+        by the undo history are kept; the compaction drops all other blobs
+        that nothing refers to anymore.
+        """
+        self._move_out_of_line()
+        self.persistence.compact(self._history_blobs())
+
+    def _move_out_of_line(self, batch_size=IMPORT_BATCH):
+        if self.vault is not None:
+            # Encrypted values stay inline, see _store_value
+            return
+        ops = []
+        for key, item in list(self.items.items()):
+            if not any(isinstance(value, str) and len(value) > BLOB_THRESHOLD for value in item.values()):
+                continue
+            moved = item.map_contexts(lambda label, value: self.values.acquire(self._store_value(value, key, label)))
+            self._remove(key)
+            self.items[key] = moved
+            self._index_item(key, moved)
+            ops += [('delete', key), ('add', key, moved)]
+            if len(ops) >= batch_size:
+                self.persistence.submit_many(ops)
+                ops = []
+        if ops:
+            self.persistence.submit_many(ops)
+
+    def _history_blobs(self):
+        return frozenset(
+            value.digest
+            for version in self.versions.versions.values()
+            for _, before, after in version.changes
+            for item in (before, after) if item is not None
+            for value in item.values() if isinstance(value, BlobRef)
+        )
+
+    def flush(self):
+        self.persistence.flush()
+
+    def close(self):
+        """Write pending changes and release the storage."""
+        self.stop_loading()
+        self.persistence.close()
+        self.usage.close()
+        self.blobs.close()
+
+    def _remove(self, key):
+        item = self.items.pop(key, None)
+        if item is not None:
+            self._unindex_item(key, item)
+            for cached in [cached for cached in self._hot_values if cached[0] == key]:
+                del self._hot_values[cached]
+            for value in item.values():
+                self.values.release(value)
+        return item
+
+    def _index_item(self, key, item):
+        if item.title is not None:
+            self._titles.setdefault(item.title, set()).add(key)
+        self.search_index.add(key, item)
+        self.fuzzy_matcher.add(key, item)
+
+    def _unindex_item(self, key, item):
+        keys = self._titles.get(item.title)
+        if keys:
+            keys.discard(key)
+        self.search_index.remove(key)
+        self.fuzzy_matcher.remove(key)
+
+    def _clear_indexes(self):
+        self.values.clear()
+        self._hot_values.clear()
+        self._titles.clear()
+        self.search_index.clear()
+        self.fuzzy_matcher.clear()
@@ -0,0 +1,147 @@
+"""Timing spans and counters for the store and the window.
+
+Off by default, when a span costs one attribute check. Once enabled, spans
+and counter changes are kept in memory and can be summarized for the debug
+overlay or written as a Chrome trace (chrome://tracing, ui.perfetto.dev):
+
+    with tracer.span('load.page') as span:
+        keys = ...
+        span.set(items=len(keys))
+    tracer.count('bytes_written', len(data))
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Trace events kept in memory; the oldest are dropped first
+MAX_EVENTS = 200000
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        """Attach values known only inside the span, e.g. how many items it handled."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.name, self.start, time.perf_counter_ns(), self.args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects spans and counters from any thread."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.counters = {}
+        # Span name -> [calls, total ns, longest ns]
+        self.totals = {}
+        self._threads = {}
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.counters.clear()
+            self.totals.clear()
+
+    def span(self, name, **args):
+        return _Span(self, name, args) if self.enabled else _NULL_SPAN
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        with self._lock:
+            value = self.counters[name] = self.counters.get(name, 0) + amount
+            self.events.append(('C', name, now, 0, value, self._thread()))
+
+    def summary(self, limit=None):
+        """(name, calls, total ms, longest ms) per span name, most total time first."""
+        with self._lock:
+            rows = [(name, calls, total / 1e6, longest / 1e6) for name, (calls, total, longest) in self.totals.items()]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def format_summary(self, limit=None):
+        lines = [f"{name:<22} {calls:>6} {total:>9.1f} ms {longest:>7.1f} max"
+                 for name, calls, total, longest in self.summary(limit)]
+        lines += [f"{name:<22} {value:>6}" for name, value in sorted(self.counters.items())]
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path):
+        """Write the collected events in the Chrome trace event format."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        trace = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in threads.items()
+        ]
+        for phase, name, start, duration, args, tid in events:
+            event = {'name': name, 'ph': phase, 'ts': (start - self._origin) / 1000, 'pid': pid, 'tid': tid}
+            if phase == 'X':
+                event['dur'] = duration / 1000
+                event['args'] = args
+            else:
+                event['args'] = {name: args}
+            trace.append(event)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+    def _record(self, name, start, end, args):
+        duration = end - start
+        with self._lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                totals = self.totals[name] = [0, 0, 0]
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] = max(totals[2], duration)
+            self.events.append(('X', name, start, duration, args, self._thread()))
+
+    def _thread(self):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        return tid
+
+
+# The process-wide tracer the store and the window report to
+tracer = Tracer()
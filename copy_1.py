@@ -1,15 +1,246 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import pyperclip
-import json
+import argparse
+import importlib.util
 import os
+import sys
+import queue
+import selectors
+import socket
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import accumulate, islice
+
+from clipboard_store import (
+    ItemStore, Item, BlobRef, ClipboardHistory, HistoryEntry, PassphraseError, DuplicateTitleError,
+    STORAGE_BACKENDS, LOAD_PAGE_SIZE, SAVE_DELAY, key_file_path,
+)
+from clipboard_io import parse_record
+from clipboard_trace import tracer
+from clipboard_ipc import IPCServer, socket_path
+
+# Spacing around each row in the virtualized item list
+ROW_PADX = 5
+ROW_PADY = 8
+# Extra pixels above and below the viewport that still get real widgets
+RENDER_OVERSCAN = 200
+# Milliseconds of typing pause before the search filter is applied
+SEARCH_DELAY = 80
+# Milliseconds a toast message stays on screen
+TOAST_DURATION = 1500
+# Changes affecting more rows than this rebuild the list instead of updating it row by row
+MAX_ROW_UPDATES = 100
+# Seconds between store syncs while the resident mode runs without a window
+RESIDENT_POLL = 0.5
+
+# Imported on first use by load_tk() and PyperclipClipboard, so --resident starts without them
+tk = ttk = messagebox = simpledialog = None
+pyperclip = None
+
+
+def load_tk():
+    """Import tkinter; the resident mode only does so once a window is needed."""
+    global tk, ttk, messagebox, simpledialog
+    if tk is None:
+        import tkinter
+        from tkinter import ttk as _ttk, messagebox as _messagebox, simpledialog as _simpledialog
+        tk, ttk, messagebox, simpledialog = tkinter, _ttk, _messagebox, _simpledialog
+
+
+def load_pyperclip():
+    """The pyperclip module, or None when it isn't installed."""
+    global pyperclip
+    if pyperclip is None:
+        try:
+            import pyperclip as module
+        except ImportError:
+            return None
+        pyperclip = module
+    return pyperclip
+
+
+def default_clipboard_backend():
+    """pyperclip when it is installed, otherwise Tk's clipboard.
+
+    On X11 the text Tk copied goes away with the window, so anything copied
+    just before closing would be lost; xclip/xsel keep it.
+    """
+    return 'pyperclip' if importlib.util.find_spec('pyperclip') is not None else 'tk'
+
+
+class TkClipboard:
+    """Copies through Tk's own clipboard, without spawning any process.
+
+    Must be called on the UI thread. On X11 the copied text stays available
+    while the application runs.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def copy(self, text, done):
+        try:
+            with tracer.span('copy.tk', chars=len(text)):
+                self.root.clipboard_clear()
+                self.root.clipboard_append(text)
+        except tk.TclError as e:
+            done(e)
+        else:
+            done(None)
+
+    def paste(self, done):
+        """Call done with the current clipboard text, or None if it holds none, right away."""
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            text = None
+        done(text)
+
+    def close(self):
+        pass
+
+
+class PyperclipClipboard:
+    """Runs pyperclip on a worker thread so its xclip/xsel calls never block the UI.
+
+    Copies queued while one is in flight collapse to the newest text, since
+    only the last one would survive on the clipboard anyway. Pastes queued
+    meanwhile share one read, made after the copy.
+    """
+
+    def __init__(self, root=None):
+        if load_pyperclip() is None:
+            raise RuntimeError("The pyperclip clipboard backend needs the pyperclip package")
+        self._pending = None
+        self._pastes = []
+        self._wakeup = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="clipboard", daemon=True)
+        self._thread.start()
+
+    def copy(self, text, done):
+        with self._wakeup:
+            self._pending = (text, done)
+            self._wakeup.notify()
+
+    def paste(self, done):
+        """Read the clipboard on the worker thread; done gets the text, or None, there too."""
+        with self._wakeup:
+            self._pastes.append(done)
+            self._wakeup.notify()
+
+    def close(self):
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while self._pending is None and not self._pastes and not self._closed:
+                    self._wakeup.wait()
+                if self._pending is None and not self._pastes:
+                    return
+                copy, self._pending = self._pending, None
+                pastes, self._pastes = self._pastes, []
+            if copy is not None:
+                text, done = copy
+                try:
+                    with tracer.span('copy.pyperclip', chars=len(text)):
+                        pyperclip.copy(text)
+                except Exception as e:
+                    done(e)
+                else:
+                    done(None)
+            if pastes:
+                try:
+                    text = pyperclip.paste()
+                except Exception:
+                    text = None
+                for done in pastes:
+                    done(text)
+
+
+CLIPBOARD_BACKENDS = {
+    'tk': TkClipboard,
+    'pyperclip': PyperclipClipboard,
+}
+
+
+class ClipboardWatcher:
+    """Polls the clipboard from Tk's event loop and reports each new text.
+
+    The interval doubles while the clipboard stays unchanged, up to
+    MAX_INTERVAL, and drops back to MIN_INTERVAL on a change, so an idle
+    session costs one clipboard read every few seconds. A backend may answer
+    a read from another thread; the text comes back through a queue and is
+    picked up by a later poll, with one read in flight at a time.
+    """
+
+    MIN_INTERVAL = 250
+    MAX_INTERVAL = 5000
+
+    def __init__(self, root, clipboard, on_change):
+        self.root = root
+        self.clipboard = clipboard
+        self.on_change = on_change
+        self.interval = self.MIN_INTERVAL
+        self._last_text = None
+        self._job = None
+        self._results = queue.Queue()
+        self._reading = False
+
+    @property
+    def running(self):
+        return self._job is not None
+
+    def start(self):
+        if self._job is None:
+            self.interval = self.MIN_INTERVAL
+            # A read still in flight from before stop() reports to the old queue
+            self._results = queue.Queue()
+            self._reading = False
+            self._job = self.root.after(0, self._poll)
+
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def _poll(self):
+        if not self._reading:
+            self._reading = True
+            self.clipboard.paste(self._results.put)
+        try:
+            text = self._results.get_nowait()
+        except queue.Empty:
+            # Still reading; look again after the same interval
+            pass
+        else:
+            self._reading = False
+            if text is not None and text != self._last_text:
+                self._last_text = text
+                self.interval = self.MIN_INTERVAL
+                self.on_change(text)
+            else:
+                self.interval = min(self.interval * 2, self.MAX_INTERVAL)
+        self._job = self.root.after(self.interval, self._poll)
+
 
 class ClipboardManager:
-    def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("One-Click Clipboard Manager")
-        self.root.geometry("600x700")
-        self.root.configure(bg='#ffffff')
+    def __init__(self, data_file="clipboard_data.json", backend='journal', save_delay=SAVE_DELAY,
+                 clipboard=None, watch=False, serve=True, encrypt=False, passphrase=None, overlay=False,
+                 resident=False):
+        """resident: start with only the store and the request server; the window is built on first use.
+
+        clipboard: a CLIPBOARD_BACKENDS name, by default default_clipboard_backend().
+        """
+        self.resident = resident
+        self.root = None
+        self._clipboard_backend = clipboard or default_clipboard_backend()
+        self._watch = watch
+        self._quitting = False
 
         # Custom colors
         self.colors = {
@@ -21,16 +252,164 @@ class ClipboardManager:
             'border': '#e2e8f0'
         }
 
-        # Data storage
-        self.items = []
-        self.data_file = "clipboard_data.json"
-
-        # Load saved data
-        self.load_data()
+        # Data storage: items, indexes and persistence live in the store
+        self.store = self._open_store(data_file, backend, save_delay, encrypt, passphrase)
+        self.items = self.store.items
+        self._query = ""
+        self._search_job = None
+        self._launcher = None
+        # Versions dialog and the version its list was last drawn for
+        self._versions_window = None
+        self._listed_version = None
+        # Add dialog, hidden between uses, and the function refilling it
+        self._add_dialog = None
+        self._reset_add_dialog = None
+
+        # Copying: backend, recent copy-to-ready latencies in ms, toast state
+        self.clipboard = None
+        self.copy_latencies = deque(maxlen=100)
+        self._copy_errors = queue.Queue()
+        self._toast = None
+        self._toast_job = None
+
+        # Clipboard history, recorded while the watcher runs and shown in place of the items
+        self.history = ClipboardHistory()
+        self.watcher = None
+        self._showing_history = False
+
+        # Socket API for scripts, answered on this thread from the loaded store
+        self.server = None
+
+        # Debug overlay with the tracer's timings, toggled with F12
+        self._overlay = None
+        self._show_overlay = overlay
+
+        # Virtualized list state: display order, row geometry and widget pools
+        # The list is built by show_window(); until then canvas is None
+        self.canvas = None
+        self._view_keys = []
+        # The first _pinned view keys are the hot section: the most copied items, by frecency rank
+        self._pinned = 0
+        self._hot_ranks = {}
+        self._row_heights = []
+        self._row_offsets = [0]
+        self._measured_heights = {}
+        self._rendered_rows = {}
+        self._visible = (0, 0)
+        self._row_pool = {'multi_context': [], 'simple': [], 'history': []}
+        self._render_pending = False
+        self._rendering = False
+        self._rerender = False
+        self._load_job = None
+
+        if resident:
+            # Nothing is on screen to page into, so the whole store is read up front
+            try:
+                self.store.load_all()
+            except Exception as e:
+                print(f"Error loading data: {e}")
+            if serve:
+                self.start_server()
+            if self.server is None:
+                # Nothing could ask for the window later
+                self.show_window()
+            elif watch:
+                # The watcher polls from Tk's loop
+                self._ensure_root()
+            return
 
         # Setup UI
+        self._ensure_root()
         self.setup_ui()
 
+        # Load saved data: the newest page now, the rest from idle callbacks
+        self.load_data()
+        if serve:
+            self.start_server()
+        if overlay:
+            self.toggle_overlay()
+
+    def _ensure_root(self):
+        """Create the Tk root, withdrawn in the resident mode, with the clipboard backend and watcher."""
+        if self.root is not None:
+            return
+        load_tk()
+        self.root = tk.Tk()
+        self.root.title("One-Click Clipboard Manager")
+        self.root.geometry("600x700")
+        self.root.configure(bg='#ffffff')
+        if self.resident:
+            self.root.withdraw()
+        self.root.protocol("WM_DELETE_WINDOW", self.hide_window if self.resident else self.on_closing)
+        self.root.bind("<Control-q>", lambda e: self.on_closing())
+
+        if self.clipboard is None:
+            self.clipboard = CLIPBOARD_BACKENDS[self._clipboard_backend](self.root)
+        self.watcher = ClipboardWatcher(self.root, self.clipboard, self._on_clipboard_change)
+        if self._watch:
+            self.watcher.start()
+        if self.server is not None:
+            self._watch_server()
+        self.root.after(500, self._poll_background)
+
+    def show_window(self, event=None):
+        """Show the main window, building it the first time."""
+        self._ensure_root()
+        if self.canvas is None:
+            with tracer.span('window.build'):
+                self.setup_ui()
+            if self._show_overlay:
+                self.toggle_overlay()
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+
+    def hide_window(self, event=None):
+        """Hide the window but keep it, and the store, ready to show again."""
+        self.root.withdraw()
+
+    def _ensure_clipboard(self):
+        # pyperclip copies without a Tk root; Tk's clipboard needs one
+        if self.clipboard is None:
+            if self._clipboard_backend == 'tk':
+                self._ensure_root()
+            else:
+                self.clipboard = CLIPBOARD_BACKENDS[self._clipboard_backend]()
+
+    def _open_store(self, data_file, backend, save_delay, encrypt, passphrase):
+        """Open the store, asking for its passphrase when it is (or is to be) encrypted."""
+        new = not os.path.exists(key_file_path(data_file))
+        # The store opens before the window exists, so prompts get a hidden root of their own
+        prompt_root = None
+        try:
+            if passphrase is None and (encrypt or not new):
+                prompt_root = self._prompt_root()
+                passphrase = self._ask_passphrase(new, prompt_root)
+            while True:
+                try:
+                    return ItemStore(data_file, backend, save_delay, passphrase)
+                except PassphraseError as e:
+                    prompt_root = prompt_root or self._prompt_root()
+                    messagebox.showerror("Error", str(e), parent=prompt_root)
+                    passphrase = self._ask_passphrase(new, prompt_root)
+        finally:
+            if prompt_root is not None:
+                prompt_root.destroy()
+
+    @staticmethod
+    def _prompt_root():
+        load_tk()
+        root = tk.Tk()
+        root.withdraw()
+        return root
+
+    def _ask_passphrase(self, new, parent):
+        prompt = "Choose a passphrase for the store:" if new else "Passphrase:"
+        passphrase = simpledialog.askstring("Passphrase", prompt, show='*', parent=parent)
+        if passphrase is None:
+            raise SystemExit("No passphrase given")
+        return passphrase
+
     def setup_ui(self):
         # Title
         title_frame = tk.Frame(self.root, bg=self.colors['background'])
@@ -54,33 +433,51 @@ class ClipboardManager:
         )
         subtitle.pack(pady=(5, 0))
 
-        # Items frame with scrollbar
-        items_frame = tk.Frame(self.root, bg=self.colors['background'])
-        items_frame.pack(pady=(10, 0), padx=40, fill='both', expand=True)
+        # Search box, filters the list as you type
+        search_frame = tk.Frame(self.root, bg=self.colors['background'])
+        search_frame.pack(fill='x', padx=45)
 
-        # Scrollable canvas
-        canvas = tk.Canvas(items_frame, bg=self.colors['background'], highlightthickness=0)
-        scrollbar = ttk.Scrollbar(items_frame, orient="vertical", command=canvas.yview)
-        self.scrollable_frame = tk.Frame(canvas, bg=self.colors['background'])
+        search_label = tk.Label(
+            search_frame,
+            text="Search:",
+            font=("Segoe UI", 10, "bold"),
+            bg=self.colors['background'],
+            fg=self.colors['text']
+        )
+        search_label.pack(side='left', padx=(0, 8))
 
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(
+            search_frame,
+            textvariable=self.search_var,
+            font=("Segoe UI", 10),
+            border=1,
+            relief='solid'
         )
+        search_entry.pack(side='left', fill='x', expand=True, ipady=3)
+        self.search_var.trace_add('write', lambda *args: self._schedule_search())
 
-        self._canvas_window = canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        # Items frame with scrollbar
+        items_frame = tk.Frame(self.root, bg=self.colors['background'])
+        items_frame.pack(pady=(10, 0), padx=40, fill='both', expand=True)
 
-        def update_scrollable_frame_width(event):
-            canvas.itemconfig(self._canvas_window, width=event.width)
-        canvas.bind("<Configure>", update_scrollable_frame_width)
+        # Virtualized canvas: only rows inside the viewport get widgets
+        self.canvas = tk.Canvas(
+            items_frame,
+            bg=self.colors['background'],
+            highlightthickness=0,
+            yscrollincrement=20
+        )
+        self.scrollbar = ttk.Scrollbar(items_frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_canvas_scroll)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
 
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
 
         def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
+            self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+        self.canvas.bind_all("<MouseWheel>", _on_mousewheel)
 
         # Bottom Buttons Frame
         bottom_buttons_frame = tk.Frame(self.root, bg=self.colors['background'])
@@ -105,6 +502,61 @@ class ClipboardManager:
         add_btn.pack(side='left', padx=(0, 10))
         self.create_hover_effect(add_btn, '#1d4ed8', self.colors['primary'])
 
+        # Keyboard quick-copy launcher
+        launcher_btn = tk.Button(
+            inner_buttons_container,
+            text="Quick Copy (Ctrl+K)",
+            command=self.open_launcher,
+            bg='#10b981',
+            fg='white',
+            font=("Segoe UI", 10, "bold"),
+            relief='flat',
+            padx=15,
+            pady=8,
+            cursor='hand2'
+        )
+        launcher_btn.pack(side='left', padx=10)
+        self.create_hover_effect(launcher_btn, '#059669', '#10b981')
+        self.root.bind("<Control-k>", self.open_launcher)
+        self.root.bind("<F12>", self.toggle_overlay)
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.bind("<Control-Z>", self.redo)
+
+        # Switch the list between saved items and captured clipboard history
+        self.history_btn = tk.Button(
+            inner_buttons_container,
+            text="History",
+            command=self.toggle_history,
+            bg='white',
+            fg=self.colors['text'],
+            font=("Segoe UI", 10, "bold"),
+            relief='solid',
+            borderwidth=1,
+            padx=15,
+            pady=7,
+            cursor='hand2'
+        )
+        self.history_btn.pack(side='left', padx=10)
+        self.create_hover_effect(self.history_btn, '#f1f5f9', 'white')
+
+        # Undo history of the saved items
+        versions_btn = tk.Button(
+            inner_buttons_container,
+            text="Versions",
+            command=self.open_versions,
+            bg='white',
+            fg=self.colors['text'],
+            font=("Segoe UI", 10, "bold"),
+            relief='solid',
+            borderwidth=1,
+            padx=15,
+            pady=7,
+            cursor='hand2'
+        )
+        versions_btn.pack(side='left', padx=10)
+        self.create_hover_effect(versions_btn, '#f1f5f9', 'white')
+
         # Clear all button
         clear_btn = tk.Button(
             inner_buttons_container,
@@ -122,6 +574,16 @@ class ClipboardManager:
         clear_btn.pack(side='left', padx=(10, 0))
         self.create_hover_effect(clear_btn, '#fee2e2', 'white')
 
+        # Status line for background save errors
+        self.status_label = tk.Label(
+            bottom_buttons_frame,
+            text="",
+            font=("Segoe UI", 9),
+            bg=self.colors['background'],
+            fg=self.colors['danger']
+        )
+        self.status_label.pack(pady=(8, 0))
+
         # Load existing items
         self.refresh_items()
 
@@ -129,19 +591,35 @@ class ClipboardManager:
         widget.bind("<Enter>", lambda e: widget.configure(bg=color_on_hover))
         widget.bind("<Leave>", lambda e: widget.configure(bg=color_on_leave))
 
-    def add_item_with_contexts(self):
-        """Adds an item with multiple context fields."""
+    def add_item_with_contexts(self, title="", contexts=()):
+        """Adds an item with multiple context fields, optionally prefilled with (label, value) pairs."""
+        if self._add_dialog is None:
+            self._build_add_dialog()
+        dialog = self._add_dialog
+        self._reset_add_dialog(title, contexts)
+
+        # Center the dialog
+        dialog.geometry("+%d+%d" % (self.root.winfo_rootx() + 50, 
+                                   self.root.winfo_rooty() + 50))
+        dialog.deiconify()
+        dialog.lift()
+        dialog.grab_set()
+
+    def _close_add_dialog(self):
+        # Hidden rather than destroyed, so the next add opens instantly
+        self._add_dialog.grab_release()
+        self._add_dialog.withdraw()
+
+    def _build_add_dialog(self):
         dialog = tk.Toplevel(self.root)
+        dialog.withdraw()
         dialog.title("Add Clipboard Item with Contexts")
         dialog.geometry("500x600")
         dialog.configure(bg=self.colors['background'])
         dialog.resizable(True, True)
         dialog.transient(self.root)
-        dialog.grab_set()
-
-        # Center the dialog
-        dialog.geometry("+%d+%d" % (self.root.winfo_rootx() + 50, 
-                                   self.root.winfo_rooty() + 50))
+        dialog.protocol("WM_DELETE_WINDOW", self._close_add_dialog)
+        self._add_dialog = dialog
 
         # Main container with scrollbar
         main_frame = tk.Frame(dialog, bg=self.colors['background'])
@@ -198,7 +676,7 @@ class ClipboardManager:
         # Store context entries
         context_entries = []
 
-        def add_context_field():
+        def add_context_field(label="", value=""):
             context_frame = tk.Frame(contexts_scrollable_frame, bg=self.colors['card'], 
                                    relief='solid', borderwidth=1, padx=10, pady=8)
             context_frame.pack(fill='x', pady=5, padx=2)
@@ -213,6 +691,7 @@ class ClipboardManager:
             label_entry = tk.Entry(label_frame, font=("Segoe UI", 9), width=20, 
                                  border=1, relief='solid')
             label_entry.pack(fill='x')
+            label_entry.insert(0, label)
 
             # Context value
             value_frame = tk.Frame(context_frame, bg=self.colors['card'])
@@ -224,6 +703,7 @@ class ClipboardManager:
             value_entry = tk.Entry(value_frame, font=("Segoe UI", 9), width=30, 
                                  border=1, relief='solid')
             value_entry.pack(fill='x')
+            value_entry.insert(0, value)
 
             # Remove button
             remove_btn = tk.Button(
@@ -252,10 +732,20 @@ class ClipboardManager:
             frame.destroy()
             contexts_scrollable_frame.update_idletasks()
 
-        # Add initial context fields
-        add_context_field()
-        add_context_field()
-        add_context_field()
+        def reset(title, contexts):
+            title_entry.delete(0, 'end')
+            title_entry.insert(0, title)
+            for _, _, context_frame in context_entries:
+                context_frame.destroy()
+            context_entries.clear()
+            # Add initial context fields
+            for label, value in contexts:
+                add_context_field(label, value)
+            for _ in range(max(3 - len(contexts), 0)):
+                add_context_field()
+            title_entry.focus_set()
+
+        self._reset_add_dialog = reset
 
         # Add context button
         add_context_btn = tk.Button(
@@ -290,28 +780,24 @@ class ClipboardManager:
                 label = label_entry.get().strip()
                 value = value_entry.get().strip()
                 if label and value:  # Only add if both label and value are provided
-                    contexts.append({"label": label, "value": value})
+                    contexts.append((label, value))
 
             if not contexts:
                 messagebox.showwarning("Warning", "Please add at least one context with both label and value.")
                 return
 
             # Check if title already exists
-            for item in self.items:
-                if isinstance(item, dict) and item.get('title') == title:
-                    messagebox.showinfo("Info", "An item with this title already exists!")
-                    return
+            self._finish_loading()
+            if self.store.has_title(title):
+                messagebox.showinfo("Info", "An item with this title already exists!")
+                return
 
             # Add new item with contexts
-            new_item = {
-                'title': title, 
-                'contexts': contexts,
-                'type': 'multi_context'
-            }
-            self.items.append(new_item)
-            self.refresh_items()
-            self.save_data()
-            dialog.destroy()
+            new_item = Item.multi_context(title, contexts)
+            key = self.store.add(new_item)
+            if not self._showing_history and self.store.matches(key, self._query):
+                self.insert_item_row(key)
+            self._close_add_dialog()
 
         save_btn = tk.Button(
             btn_frame,
@@ -331,7 +817,7 @@ class ClipboardManager:
         cancel_btn = tk.Button(
             btn_frame,
             text="Cancel",
-            command=dialog.destroy,
+            command=self._close_add_dialog,
             bg='white',
             fg=self.colors['text'],
             font=("Segoe UI", 10),
@@ -344,277 +830,1137 @@ class ClipboardManager:
         cancel_btn.pack(side='right', padx=(0, 10))
         self.create_hover_effect(cancel_btn, '#f1f5f9', 'white')
 
-    def copy_to_clipboard(self, text):
-        if text:
-            pyperclip.copy(text)
-            messagebox.showinfo("Success", "Text copied to clipboard!")
-        else:
-            messagebox.showinfo("Error", "Nothing to copy.")
-
-    def delete_item(self, item):
-        if item in self.items:
-            self.items.remove(item)
-            self.refresh_items()
-            self.save_data()
-
-    def refresh_items(self):
-        # Clear existing items
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        # Create item frames for each item in reverse order (newest on top)
-        for item in reversed(self.items):
-            # Handle both old format (string/dict with content) and new format (dict with contexts)
-            if isinstance(item, dict) and item.get('type') == 'multi_context':
-                self.create_multi_context_item(item)
-            elif isinstance(item, dict):
-                # Old format with title and content
-                self.create_simple_item(item)
-            else:
-                # Very old format (just string)
-                self.create_simple_item({'title': 'Untitled', 'content': str(item)})
-
-    def create_multi_context_item(self, item):
-        """Create a display for multi-context items."""
-        item_title = item.get('title', 'Untitled')
-        contexts = item.get('contexts', [])
-
-        # Main item frame
-        item_frame = tk.Frame(
-            self.scrollable_frame,
-            bg=self.colors['card'],
-            padx=15,
-            pady=15,
-            borderwidth=1,
-            relief="solid",
-            highlightbackground=self.colors['border']
+    def open_launcher(self, event=None):
+        """Keyboard-driven quick copy: fuzzy match items and contexts, Enter copies.
+
+        Works without the main window, e.g. from a hotkey bound to `clipboard_ipc.py launcher`.
+        """
+        self._ensure_root()
+        if self._launcher is None:
+            self._build_launcher()
+        launcher = self._launcher
+        if launcher.state() == 'withdrawn':
+            self._place_dialog(launcher, 520, 360, 40, 80)
+            # Rematches against the store as it is now
+            self._launcher_query.set("")
+            launcher.deiconify()
+        launcher.lift()
+        launcher.focus_force()
+        self._launcher_entry.focus_set()
+
+    def _build_launcher(self):
+        launcher = tk.Toplevel(self.root)
+        launcher.withdraw()
+        launcher.title("Quick Copy")
+        launcher.configure(bg=self.colors['background'])
+        launcher.protocol("WM_DELETE_WINDOW", launcher.withdraw)
+        self._launcher = launcher
+
+        query_var = tk.StringVar()
+        query_entry = tk.Entry(
+            launcher,
+            textvariable=query_var,
+            font=("Segoe UI", 12),
+            border=1,
+            relief='solid'
         )
-        item_frame.pack(fill='x', pady=8, padx=5, ipady=5, ipadx=5)
+        query_entry.pack(fill='x', padx=12, pady=(12, 8), ipady=4)
 
-        # Title label
-        title_label = tk.Label(
-            item_frame,
-            text=item_title,
-            justify='left',
-            anchor='w',
+        results_list = tk.Listbox(
+            launcher,
+            font=("Segoe UI", 10),
+            activestyle='none',
+            relief='flat',
+            highlightthickness=0,
             bg=self.colors['card'],
-            fg=self.colors['primary'],
-            font=("Segoe UI", 12, "bold"),
-            padx=5
+            fg=self.colors['text'],
+            selectbackground=self.colors['primary']
         )
-        title_label.pack(fill='x', anchor='w', pady=(0, 10))
-
-        # Contexts frame
-        contexts_frame = tk.Frame(item_frame, bg=self.colors['card'])
-        contexts_frame.pack(fill='x', pady=(0, 10))
-
-        for i, context in enumerate(contexts):
-            context_row = tk.Frame(contexts_frame, bg=self.colors['card'])
-            context_row.pack(fill='x', pady=2)
-
-            # Context label
-            label_text = tk.Label(
-                context_row,
-                text=f"{context['label']}:",
-                font=("Segoe UI", 9, "bold"),
-                bg=self.colors['card'],
-                fg=self.colors['text'],
-                width=12,
-                anchor='w'
-            )
-            label_text.pack(side='left', padx=(5, 10))
-
-            # Context value
-            value_text = tk.Label(
-                context_row,
-                text=context['value'],
-                font=("Segoe UI", 9),
-                bg=self.colors['card'],
-                fg=self.colors['text'],
-                anchor='w'
-            )
-            value_text.pack(side='left', fill='x', expand=True)
-
-            # Copy button for individual context
-            copy_context_btn = tk.Button(
-                context_row,
-                text="Copy",
-                command=lambda v=context['value']: self.copy_to_clipboard(v),
-                bg='#10b981',
+        results_list.pack(fill='both', expand=True, padx=12, pady=(0, 12))
+
+        results = []
+
+        def update_results(*args):
+            results[:] = self.store.fuzzy(query_var.get())
+            results_list.delete(0, 'end')
+            if results:
+                results_list.insert('end', *[result[0] for result in results])
+                select(0)
+
+        def select(index):
+            results_list.selection_clear(0, 'end')
+            results_list.selection_set(index)
+            results_list.activate(index)
+            results_list.see(index)
+
+        def move_selection(delta):
+            if results:
+                current = results_list.curselection()
+                select(min(max((current[0] if current else 0) + delta, 0), len(results) - 1))
+            return "break"
+
+        def copy_selected(event=None):
+            selection = results_list.curselection()
+            if selection:
+                _, value, key, label = results[selection[0]]
+                launcher.withdraw()
+                self.copy_to_clipboard(value, key, label)
+
+        query_var.trace_add('write', update_results)
+        query_entry.bind("<Down>", lambda e: move_selection(1))
+        query_entry.bind("<Up>", lambda e: move_selection(-1))
+        query_entry.bind("<Return>", copy_selected)
+        results_list.bind("<Double-Button-1>", copy_selected)
+        launcher.bind("<Escape>", lambda e: launcher.withdraw())
+        self._launcher_query = query_var
+        self._launcher_entry = query_entry
+
+    def _place_dialog(self, window, width, height, dx, dy):
+        """Place a dialog by the main window, or mid-screen while the window is hidden."""
+        if self.root.winfo_viewable():
+            window.transient(self.root)
+            x, y = self.root.winfo_rootx() + dx, self.root.winfo_rooty() + dy
+        else:
+            # A transient of a withdrawn window would stay hidden with it
+            window.transient('')
+            x = (window.winfo_screenwidth() - width) // 2
+            y = (window.winfo_screenheight() - height) // 3
+        window.geometry("%dx%d+%d+%d" % (width, height, x, y))
+
+    def copy_to_clipboard(self, value, key=None, label=None):
+        """Copy a value; blob references and whole items are only read in full here.
+
+        key, and label for a single context, count the copy towards the item's usage.
+        """
+        with tracer.span('copy'):
+            self._copy_value(value, key, label)
+
+    def _copy_value(self, value, key, label):
+        started = time.perf_counter()
+        try:
+            text = self.store.copy_text(key, label) if key is not None else None
+            if text is None:
+                text = self.store.resolve(value)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error reading value: {e}")
+            self.show_toast(f"Copy failed: {e}", error=True)
+            return
+        if not text:
+            self.show_toast("Nothing to copy.", error=True)
+            return
+
+        def done(error):
+            # May run on the clipboard worker thread
+            self.copy_latencies.append((time.perf_counter() - started) * 1000)
+            if error is not None:
+                self._copy_errors.put(error)
+
+        self._ensure_clipboard()
+        self.clipboard.copy(text, done)
+        if key is not None:
+            self.store.record_copy(key, label)
+        self.show_toast("Copied to clipboard")
+
+    def show_toast(self, message, error=False):
+        """Show a short message near the bottom of the window that hides itself."""
+        if self.root is None:
+            return
+        if self._toast is None:
+            self._toast = tk.Label(
+                self.root,
+                font=("Segoe UI", 10, "bold"),
                 fg='white',
-                font=("Segoe UI", 8),
-                relief='flat',
-                padx=8,
-                pady=2,
-                cursor='hand2'
+                padx=14,
+                pady=6
             )
-            copy_context_btn.pack(side='right', padx=(5, 0))
-            self.create_hover_effect(copy_context_btn, '#059669', '#10b981')
-
-        # Button frame
-        btn_frame = tk.Frame(item_frame, bg=self.colors['card'])
-        btn_frame.pack(fill='x', pady=(10, 0))
-
-        # Copy all button
-        all_text = "\n".join([f"{ctx['label']}: {ctx['value']}" for ctx in contexts])
-        copy_all_btn = tk.Button(
-            btn_frame,
-            text="Copy All",
-            command=lambda: self.copy_to_clipboard(all_text),
-            bg=self.colors['primary'],
-            fg='white',
-            font=("Segoe UI", 9, "bold"),
+        self._toast.configure(text=message, bg=self.colors['danger'] if error else self.colors['text'])
+        self._toast.place(relx=0.5, rely=1.0, y=-100, anchor='s')
+        self._toast.lift()
+        if self._toast_job is not None:
+            self.root.after_cancel(self._toast_job)
+        self._toast_job = self.root.after(TOAST_DURATION, self._hide_toast)
+
+    def _hide_toast(self):
+        self._toast_job = None
+        self._toast.place_forget()
+
+    def delete_item(self, key):
+        if self.store.delete(key) is not None:
+            self.remove_item_row(key)
+            self.show_toast("Deleted (Ctrl+Z to undo)")
+
+    def undo(self, event=None):
+        self._change_version(self.store.undo, "Nothing to undo")
+
+    def redo(self, event=None):
+        self._change_version(self.store.redo, "Nothing to redo")
+
+    def restore_version(self, number):
+        self._change_version(lambda: self.store.restore(number), None)
+
+    def _change_version(self, step, nothing):
+        # Restoring reads the whole store; its rows should show up too
+        self._finish_loading()
+        try:
+            ops = step()
+        except DuplicateTitleError as e:
+            messagebox.showinfo("Info", str(e))
+            return
+        if ops is None:
+            self.show_toast(nothing)
+            return
+        self.show_changes(ops)
+        self._update_versions_list()
+
+    def open_versions(self, event=None):
+        """List the store's versions, newest first; restoring one only touches the rows that differ."""
+        if self._versions_window is None:
+            self._build_versions_window()
+        window = self._versions_window
+        if window.state() == 'withdrawn':
+            self._place_dialog(window, 420, 360, 60, 100)
+            window.deiconify()
+            self._update_versions_list()
+        window.lift()
+
+    def _build_versions_window(self):
+        window = tk.Toplevel(self.root)
+        window.withdraw()
+        window.title("Versions")
+        window.configure(bg=self.colors['background'])
+        window.protocol("WM_DELETE_WINDOW", window.withdraw)
+        self._versions_window = window
+
+        self._versions_list = tk.Listbox(
+            window,
+            font=("Segoe UI", 10),
+            activestyle='none',
             relief='flat',
-            padx=12,
-            pady=5,
-            cursor='hand2'
+            highlightthickness=0,
+            bg=self.colors['card'],
+            fg=self.colors['text'],
+            selectbackground=self.colors['primary']
         )
-        copy_all_btn.pack(side='left')
-        self.create_hover_effect(copy_all_btn, '#1d4ed8', self.colors['primary'])
+        self._versions_list.pack(fill='both', expand=True, padx=12, pady=(12, 8))
 
-        # Delete button
-        del_btn = tk.Button(
-            btn_frame,
-            text="Delete",
-            command=lambda i=item: self.delete_item(i),
-            bg=self.colors['danger'],
+        def restore_selected(event=None):
+            selection = self._versions_list.curselection()
+            if selection:
+                self.restore_version(self._version_numbers[selection[0]])
+
+        restore_btn = tk.Button(
+            window,
+            text="Restore",
+            command=restore_selected,
+            bg=self.colors['primary'],
             fg='white',
-            font=("Segoe UI", 9, "bold"),
+            font=("Segoe UI", 10, "bold"),
             relief='flat',
-            padx=12,
-            pady=5,
+            padx=15,
+            pady=6,
             cursor='hand2'
         )
-        del_btn.pack(side='right')
-        self.create_hover_effect(del_btn, '#b91c1c', self.colors['danger'])
+        restore_btn.pack(pady=(0, 12))
+        self.create_hover_effect(restore_btn, '#1d4ed8', self.colors['primary'])
+        self._versions_list.bind("<Double-Button-1>", restore_selected)
+        window.bind("<Escape>", lambda e: window.withdraw())
+
+    def _update_versions_list(self):
+        # A hidden list is brought up to date when it is shown again
+        if self._versions_window is None or self._versions_window.state() == 'withdrawn':
+            return
+        current = self._listed_version = self.store.versions.current
+        versions = list(reversed(self.store.versions.history()))
+        self._version_numbers = [version.number for version in versions]
+        self._versions_list.delete(0, 'end')
+        self._versions_list.insert('end', *[
+            "%s %s  %s" % ("●" if version is current else " ",
+                           time.strftime('%H:%M:%S', time.localtime(version.created)), version.description)
+            for version in versions
+        ])
 
-    def create_simple_item(self, item):
-        """Create a display for simple items (backward compatibility)."""
-        item_title = item.get('title', 'Untitled')
-        item_content = item.get('content', '')
+    def refresh_items(self):
+        if self.canvas is None:
+            # Not built yet; show_window() draws the whole store
+            return
+        with tracer.span('render.refresh') as span:
+            self._refresh_items()
+            span.set(rows=len(self._view_keys))
+
+    def _refresh_items(self):
+        # Drop the current bindings; pooled rows are kept for reuse
+        for row in self._rendered_rows.values():
+            self._release_row(row)
+        self._rendered_rows.clear()
+
+        # Newest on top; only row heights are computed for the whole list
+        self._hot_ranks = {}
+        self._pinned = 0
+        if self._showing_history:
+            self._view_keys = self.history.keys(self._query)
+        elif self._query.strip():
+            self._view_keys = self.store.search(self._query)
+        else:
+            self._view_keys = self.store.keys()
+        if not self._showing_history:
+            # The hot section is ranked once here, so rows don't move while being copied from
+            self._hot_ranks = {key: rank for rank, key in enumerate(self.store.hot_keys())}
+            shown = set(self._view_keys)
+            hot = [key for key in self._hot_ranks if key in shown]
+            if hot:
+                self._view_keys = hot + [key for key in self._view_keys if key not in self._hot_ranks]
+                self._pinned = len(hot)
+        source = self._view_source()
+        self._row_heights = [self._estimate_row_height(source[key]) for key in self._view_keys]
+        self._update_row_offsets()
+        self.render_visible_rows()
+
+    def _schedule_search(self):
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DELAY, self.apply_search)
+
+    def apply_search(self):
+        """Filter the list down to the items matching the search box."""
+        self._search_job = None
+        query = self.search_var.get()
+        if query.split() == self._query.split():
+            return
+        self._query = query
+        self.canvas.yview_moveto(0)
+        self.refresh_items()
 
-        item_frame = tk.Frame(
-            self.scrollable_frame,
+    def insert_item_row(self, key, index=None, history=False):
+        """Show a newly added item without rebinding the rows around it; by default below the hot section.
+
+        history says which view the key belongs to; history and item keys
+        overlap, so a key for the other view is ignored.
+        """
+        if self.canvas is None or history != self._showing_history:
+            return
+        if index is None:
+            index = self._pinned
+        self._view_keys.insert(index, key)
+        self._row_heights.insert(index, self._estimate_row_height(self._view_source()[key]))
+        self._shift_rows(index, self._row_heights[index])
+
+    def append_item_rows(self, keys):
+        """Add older items below the current rows, e.g. while the store streams in."""
+        if self._showing_history or self.canvas is None:
+            return
+        if self._query.strip():
+            keys = [key for key in keys if self.store.matches(key, self._query)]
+        hot = [key for key in keys if key in self._hot_ranks]
+        if hot:
+            # Hot items that only now finished loading join the hot section
+            for key in hot:
+                rank = self._hot_ranks[key]
+                index = sum(1 for pinned in self._view_keys[:self._pinned] if self._hot_ranks[pinned] < rank)
+                self.insert_item_row(key, index)
+                self._pinned += 1
+            keys = [key for key in keys if key not in self._hot_ranks]
+        start = len(self._view_keys)
+        self._view_keys.extend(keys)
+        self._row_heights.extend(self._estimate_row_height(self.items[key]) for key in keys)
+        self._row_offsets.extend(islice(accumulate(self._row_heights[start:], initial=self._row_offsets[-1]), 1, None))
+        self._update_scrollregion()
+        self._schedule_render()
+
+    def remove_item_row(self, key, history=False):
+        """Drop a deleted item's row; only that row's widgets go back to the pool."""
+        if self.canvas is None or history != self._showing_history:
+            return
+        try:
+            index = self._view_keys.index(key)
+        except ValueError:
+            return
+        row = self._rendered_rows.pop(key, None)
+        if row is not None:
+            self._release_row(row)
+        if index < self._pinned:
+            self._pinned -= 1
+        del self._view_keys[index]
+        self._shift_rows(index, -self._row_heights.pop(index))
+
+    def _shift_rows(self, index, delta):
+        top = self.canvas.canvasy(0)
+        self._update_row_offsets()
+        # Keep the rows in view still when the change happened above them
+        if self._row_offsets[index] < top:
+            self.canvas.yview_moveto(max(top + delta, 0) / max(self._row_offsets[-1], 1))
+        self.render_visible_rows()
+
+    def _on_canvas_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._schedule_render()
+
+    def _on_canvas_configure(self, event):
+        width = max(event.width - 2 * ROW_PADX, 1)
+        for row in self._rendered_rows.values():
+            self.canvas.itemconfigure(row['window'], width=width)
+        self._update_scrollregion()
+        self._schedule_render()
+
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.root.after_idle(self.render_visible_rows)
+
+    def _view_source(self):
+        return self.history.entries if self._showing_history else self.items
+
+    def _row_kind(self, item):
+        if isinstance(item, HistoryEntry):
+            return 'history'
+        # Old title/content items and bare strings share the simple row
+        return 'multi_context' if item.kind == 'multi_context' else 'simple'
+
+    def _estimate_row_height(self, item):
+        kind = self._row_kind(item)
+        count = len(item.contexts) if kind == 'multi_context' else 1
+        height = self._measured_heights.get((kind, count))
+        if height is None:
+            height = 110 + 30 * count if kind == 'multi_context' else 140
+        return height
+
+    def _update_row_offsets(self):
+        self._row_offsets = [0]
+        self._row_offsets.extend(accumulate(self._row_heights))
+        self._update_scrollregion()
+
+    def _update_scrollregion(self):
+        with tracer.span('render.scrollregion'):
+            self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), self._row_offsets[-1]))
+
+    def _visible_range(self):
+        top = self.canvas.canvasy(0) - RENDER_OVERSCAN
+        bottom = self.canvas.canvasy(self.canvas.winfo_height()) + RENDER_OVERSCAN
+        first = max(bisect_right(self._row_offsets, top) - 1, 0)
+        last = min(bisect_right(self._row_offsets, bottom), len(self._view_keys))
+        return first, last
+
+    def render_visible_rows(self):
+        """Bind pooled row widgets to the items currently inside the viewport."""
+        self._render_pending = False
+        if self._rendering:
+            # Called from update_idletasks in _render_passes; let the running pass redo its layout
+            self._rerender = True
+            return
+
+        with tracer.span('render') as span:
+            self._render_passes()
+            span.set(rows=len(self._rendered_rows))
+        if self._rerender:
+            self._schedule_render()
+
+    def _render_passes(self):
+        self._rendering = True
+        try:
+            # Measured heights can shift the layout, so settle in a few passes
+            for _ in range(3):
+                self._rerender = False
+                first, last = self._visible_range()
+                self._visible = (first, last)
+                # Rows are keyed by item key, so shifted rows keep their widgets
+                visible = set(self._view_keys[first:last])
+                for key in [k for k in self._rendered_rows if k not in visible]:
+                    self._release_row(self._rendered_rows.pop(key))
+
+                for index in range(first, last):
+                    key = self._view_keys[index]
+                    row = self._rendered_rows.get(key)
+                    if row is None:
+                        row = self._bind_row(key)
+                        self._rendered_rows[key] = row
+                    self.canvas.coords(row['window'], ROW_PADX, self._row_offsets[index] + ROW_PADY)
+
+                self.canvas.update_idletasks()
+                if not self._measure_visible_rows() and not self._rerender:
+                    break
+            else:
+                self._rerender = True
+        finally:
+            self._rendering = False
+
+    def _measure_visible_rows(self):
+        changed = False
+        for index in range(*self._visible):
+            row = self._rendered_rows[self._view_keys[index]]
+            height = row['frame'].winfo_reqheight() + 2 * ROW_PADY
+            self._measured_heights[(row['kind'], row['size'])] = height
+            if self._row_heights[index] != height:
+                self._row_heights[index] = height
+                changed = True
+        if changed:
+            self._update_row_offsets()
+        return changed
+
+    def _bind_row(self, key):
+        item = self._view_source()[key]
+        kind = self._row_kind(item)
+        pool = self._row_pool[kind]
+        row = pool.pop() if pool else None
+
+        if kind == 'multi_context':
+            row = self.create_multi_context_item(item, row)
+        elif kind == 'history':
+            row = self.create_history_item(item, row)
+        else:
+            row = self.create_simple_item(item, row)
+
+        row['key'] = key
+        if key in self._hot_ranks and kind != 'history':
+            row['title_label'].configure(text=f"★ {item.display_title}")
+        # Pooled rows missed any resize while they were hidden
+        self.canvas.itemconfigure(row['window'], state='normal', width=max(self.canvas.winfo_width() - 2 * ROW_PADX, 1))
+        tracer.count('rows_bound')
+        return row
+
+    def _release_row(self, row):
+        self.canvas.itemconfigure(row['window'], state='hidden')
+        row['key'] = None
+        self._row_pool[row['kind']].append(row)
+
+    def _new_row(self, kind, **frame_options):
+        tracer.count('widgets.rows')
+        frame = tk.Frame(
+            self.canvas,
             bg=self.colors['card'],
-            padx=10,
-            pady=10,
             borderwidth=1,
             relief="solid",
-            highlightbackground=self.colors['border']
+            highlightbackground=self.colors['border'],
+            **frame_options
         )
-        item_frame.pack(fill='x', pady=8, padx=5, ipady=5, ipadx=5)
-
-        # Title label
-        title_label = tk.Label(
-            item_frame,
-            text=item_title,
-            justify='left',
-            anchor='w',
+        window = self.canvas.create_window(
+            ROW_PADX, 0,
+            window=frame,
+            anchor="nw",
+            width=max(self.canvas.winfo_width() - 2 * ROW_PADX, 1)
+        )
+        return {'kind': kind, 'frame': frame, 'window': window, 'key': None, 'size': 1}
+
+    def create_multi_context_item(self, item, row=None):
+        """Create a display for multi-context items, or rebind a pooled one."""
+        item_title = item.display_title
+        contexts = item.contexts
+
+        if row is None:
+            # Main item frame
+            row = self._new_row('multi_context', padx=20, pady=20)
+            item_frame = row['frame']
+
+            # Title label
+            row['title_label'] = tk.Label(
+                item_frame,
+                justify='left',
+                anchor='w',
+                bg=self.colors['card'],
+                fg=self.colors['primary'],
+                font=("Segoe UI", 12, "bold"),
+                padx=5
+            )
+            row['title_label'].pack(fill='x', anchor='w', pady=(0, 10))
+
+            # Contexts frame
+            row['contexts_frame'] = tk.Frame(item_frame, bg=self.colors['card'])
+            row['contexts_frame'].pack(fill='x', pady=(0, 10))
+            row['context_rows'] = []
+
+            # Button frame
+            btn_frame = tk.Frame(item_frame, bg=self.colors['card'])
+            btn_frame.pack(fill='x', pady=(10, 0))
+
+            # Copy all button
+            copy_all_btn = tk.Button(
+                btn_frame,
+                text="Copy All",
+                command=lambda: self.copy_to_clipboard(row['item'], row['key']),
+                bg=self.colors['primary'],
+                fg='white',
+                font=("Segoe UI", 9, "bold"),
+                relief='flat',
+                padx=12,
+                pady=5,
+                cursor='hand2'
+            )
+            copy_all_btn.pack(side='left')
+            self.create_hover_effect(copy_all_btn, '#1d4ed8', self.colors['primary'])
+
+            # Delete button
+            del_btn = tk.Button(
+                btn_frame,
+                text="Delete",
+                command=lambda: self.delete_item(row['key']),
+                bg=self.colors['danger'],
+                fg='white',
+                font=("Segoe UI", 9, "bold"),
+                relief='flat',
+                padx=12,
+                pady=5,
+                cursor='hand2'
+            )
+            del_btn.pack(side='right')
+            self.create_hover_effect(del_btn, '#b91c1c', self.colors['danger'])
+
+        row['size'] = len(contexts)
+        row['title_label'].configure(text=item_title)
+
+        # Grow the context row pool as needed; extra rows are only unpacked
+        context_rows = row['context_rows']
+        while len(context_rows) < len(contexts):
+            context_rows.append(self._create_context_row(row))
+
+        for i, context_row in enumerate(context_rows):
+            if i < len(contexts):
+                context = contexts[i]
+                context_row['value'] = context.value
+                context_row['label'] = context.label
+                context_row['label_text'].configure(text=f"{context.label}:")
+                context_row['value_text'].configure(text=self._display_value(context.value))
+                if not context_row['shown']:
+                    context_row['frame'].pack(fill='x', pady=2)
+                    context_row['shown'] = True
+            elif context_row['shown']:
+                context_row['frame'].pack_forget()
+                context_row['shown'] = False
+
+        row['item'] = item
+        return row
+
+    def _create_context_row(self, row):
+        tracer.count('widgets.context_rows')
+        context_row = {'frame': tk.Frame(row['contexts_frame'], bg=self.colors['card']),
+                       'value': '', 'label': None, 'shown': False}
+
+        # Context label
+        context_row['label_text'] = tk.Label(
+            context_row['frame'],
+            font=("Segoe UI", 9, "bold"),
             bg=self.colors['card'],
-            fg=self.colors['primary'],
-            font=("Segoe UI", 11, "bold"),
-            padx=5
+            fg=self.colors['text'],
+            width=12,
+            anchor='w'
         )
-        title_label.pack(fill='x', anchor='w')
-
-        # Content frame
-        content_frame = tk.Frame(item_frame, bg=self.colors['card'], padx=0, pady=5)
-        content_frame.pack(fill='x', expand=True)
+        context_row['label_text'].pack(side='left', padx=(5, 10))
 
-        # Content label
-        item_label = tk.Label(
-            content_frame,
-            text=item_content,
-            justify='left',
-            anchor='w',
+        # Context value
+        context_row['value_text'] = tk.Label(
+            context_row['frame'],
+            font=("Segoe UI", 9),
             bg=self.colors['card'],
             fg=self.colors['text'],
-            font=("Segoe UI", 10),
-            padx=5,
-            pady=5,
-            wraplength=480
+            anchor='w'
         )
-        item_label.pack(fill='both', expand=True, anchor='w')
-
-        # Button frame
-        btn_frame = tk.Frame(item_frame, bg=self.colors['card'], padx=5, pady=0)
-        btn_frame.pack(fill='x', side='bottom')
+        context_row['value_text'].pack(side='left', fill='x', expand=True)
 
-        # Copy button
-        copy_btn = tk.Button(
-            btn_frame,
+        # Copy button for individual context
+        copy_context_btn = tk.Button(
+            context_row['frame'],
             text="Copy",
-            command=lambda t=item_content: self.copy_to_clipboard(t),
-            bg=self.colors['primary'],
+            command=lambda: self.copy_to_clipboard(context_row['value'], row['key'], context_row['label']),
+            bg='#10b981',
             fg='white',
-            font=("Segoe UI", 9, "bold"),
+            font=("Segoe UI", 8),
             relief='flat',
-            padx=10,
-            pady=5,
+            padx=8,
+            pady=2,
             cursor='hand2'
         )
-        copy_btn.pack(side='left', padx=(0, 8))
-        self.create_hover_effect(copy_btn, '#1d4ed8', self.colors['primary'])
+        copy_context_btn.pack(side='right', padx=(5, 0))
+        self.create_hover_effect(copy_context_btn, '#059669', '#10b981')
+        return context_row
+
+    def create_simple_item(self, item, row=None):
+        """Create a display for simple items and bare strings (backward compatibility)."""
+        item_title = item.display_title
+        item_content = item.content or ''
+
+        if row is None:
+            row = self._new_row('simple', padx=15, pady=15)
+            item_frame = row['frame']
+
+            # Title label
+            row['title_label'] = tk.Label(
+                item_frame,
+                justify='left',
+                anchor='w',
+                bg=self.colors['card'],
+                fg=self.colors['primary'],
+                font=("Segoe UI", 11, "bold"),
+                padx=5
+            )
+            row['title_label'].pack(fill='x', anchor='w')
 
-        # Delete button
-        del_btn = tk.Button(
-            btn_frame,
-            text="×",
-            command=lambda i=item: self.delete_item(i),
-            bg=item_frame['bg'],
-            fg=self.colors['danger'],
-            font=("Segoe UI", 16, "bold"),
-            relief='flat',
-            width=2,
-            cursor='hand2',
-            borderwidth=0
-        )
-        del_btn.pack(side='right')
-        self.create_hover_effect(del_btn, '#fee2e2', self.colors['card'])
+            # Content frame
+            content_frame = tk.Frame(item_frame, bg=self.colors['card'], padx=0, pady=5)
+            content_frame.pack(fill='x', expand=True)
+
+            # Content label
+            row['content_label'] = tk.Label(
+                content_frame,
+                justify='left',
+                anchor='w',
+                bg=self.colors['card'],
+                fg=self.colors['text'],
+                font=("Segoe UI", 10),
+                padx=5,
+                pady=5,
+                wraplength=480
+            )
+            row['content_label'].pack(fill='both', expand=True, anchor='w')
+
+            # Button frame
+            btn_frame = tk.Frame(item_frame, bg=self.colors['card'], padx=5, pady=0)
+            btn_frame.pack(fill='x', side='bottom')
+
+            # Copy button
+            copy_btn = tk.Button(
+                btn_frame,
+                text="Copy",
+                command=lambda: self.copy_to_clipboard(row['content'], row['key']),
+                bg=self.colors['primary'],
+                fg='white',
+                font=("Segoe UI", 9, "bold"),
+                relief='flat',
+                padx=10,
+                pady=5,
+                cursor='hand2'
+            )
+            copy_btn.pack(side='left', padx=(0, 8))
+            self.create_hover_effect(copy_btn, '#1d4ed8', self.colors['primary'])
+
+            # Delete button
+            del_btn = tk.Button(
+                btn_frame,
+                text="×",
+                command=lambda: self.delete_item(row['key']),
+                bg=item_frame['bg'],
+                fg=self.colors['danger'],
+                font=("Segoe UI", 16, "bold"),
+                relief='flat',
+                width=2,
+                cursor='hand2',
+                borderwidth=0
+            )
+            del_btn.pack(side='right')
+            self.create_hover_effect(del_btn, '#fee2e2', self.colors['card'])
+
+        row['content'] = item_content
+        row['title_label'].configure(text=item_title)
+        row['content_label'].configure(text=self._display_value(item_content))
+        return row
+
+    def create_history_item(self, entry, row=None):
+        """Create a display for a captured clipboard text, or rebind a pooled one."""
+        if row is None:
+            row = self._new_row('history', padx=15, pady=12)
+            item_frame = row['frame']
+
+            # Capture time and size
+            row['time_label'] = tk.Label(
+                item_frame,
+                anchor='w',
+                bg=self.colors['card'],
+                fg='#64748b',
+                font=("Segoe UI", 9)
+            )
+            row['time_label'].pack(fill='x', anchor='w')
+
+            # Text preview
+            row['content_label'] = tk.Label(
+                item_frame,
+                justify='left',
+                anchor='w',
+                bg=self.colors['card'],
+                fg=self.colors['text'],
+                font=("Segoe UI", 10),
+                padx=5,
+                pady=5,
+                wraplength=480
+            )
+            row['content_label'].pack(fill='x', anchor='w')
+
+            btn_frame = tk.Frame(item_frame, bg=self.colors['card'])
+            btn_frame.pack(fill='x')
+
+            copy_btn = tk.Button(
+                btn_frame,
+                text="Copy",
+                command=lambda: self.copy_to_clipboard(self.history.entries[row['key']].text),
+                bg=self.colors['primary'],
+                fg='white',
+                font=("Segoe UI", 9, "bold"),
+                relief='flat',
+                padx=10,
+                pady=5,
+                cursor='hand2'
+            )
+            copy_btn.pack(side='left', padx=(0, 8))
+            self.create_hover_effect(copy_btn, '#1d4ed8', self.colors['primary'])
+
+            # Promote to a saved item through the usual add dialog
+            save_btn = tk.Button(
+                btn_frame,
+                text="Save as Item",
+                command=lambda: self.promote_history_entry(row['key']),
+                bg='#10b981',
+                fg='white',
+                font=("Segoe UI", 9, "bold"),
+                relief='flat',
+                padx=10,
+                pady=5,
+                cursor='hand2'
+            )
+            save_btn.pack(side='left')
+            self.create_hover_effect(save_btn, '#059669', '#10b981')
+
+            del_btn = tk.Button(
+                btn_frame,
+                text="×",
+                command=lambda: self.remove_history_entry(row['key']),
+                bg=self.colors['card'],
+                fg=self.colors['danger'],
+                font=("Segoe UI", 16, "bold"),
+                relief='flat',
+                width=2,
+                cursor='hand2',
+                borderwidth=0
+            )
+            del_btn.pack(side='right')
+            self.create_hover_effect(del_btn, '#fee2e2', self.colors['card'])
+
+        captured = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.captured_at))
+        row['time_label'].configure(text=f"{captured}  ·  {entry.size} bytes")
+        preview = entry.text[:300]
+        row['content_label'].configure(text=preview + ("…" if len(entry.text) > 300 else ""))
+        return row
+
+    def toggle_history(self):
+        """Switch the list between saved items and the captured clipboard history."""
+        self._showing_history = not self._showing_history
+        self.history_btn.configure(text="Saved Items" if self._showing_history else "History")
+        if self._showing_history and not self.watcher.running:
+            self.show_toast("Clipboard watching is off (start with --watch)")
+        self.canvas.yview_moveto(0)
+        self.refresh_items()
+
+    def promote_history_entry(self, key):
+        entry = self.history.entries.get(key)
+        if entry is not None:
+            title = entry.text.strip().split("\n", 1)[0][:50]
+            self.add_item_with_contexts(title, [("Text", entry.text)])
+
+    def remove_history_entry(self, key):
+        if self.history.remove(key) is not None:
+            self.remove_item_row(key, history=True)
+
+    def _on_clipboard_change(self, text):
+        entry, evicted = self.history.capture(text)
+        if not self._showing_history:
+            return
+        for key in evicted:
+            self.remove_item_row(key, history=True)
+        if entry is not None and all(word in text.lower() for word in self._query.lower().split()):
+            self.insert_item_row(entry.key, history=True)
+
+    def _display_value(self, value):
+        if isinstance(value, BlobRef):
+            # Only the preview is kept in memory; the full value is read on copy
+            return f"{value.preview}… ({value.size // 1024} KB)"
+        # Encrypted values show as a mask until copied
+        return str(value)
 
     def clear_all(self):
+        if self._showing_history:
+            if self.history.entries and messagebox.askyesno("Confirm", "Clear the clipboard history?"):
+                self.history.clear()
+                self.refresh_items()
+            return
         if self.items and messagebox.askyesno("Confirm", "Are you sure you want to clear all clipboard items?"):
-            self.items.clear()
+            # The store reads the rest first, so the clear can be undone
+            self._stop_job()
+            self.store.clear()
             self.refresh_items()
-            self.save_data()
         elif not self.items:
             messagebox.showinfo("Info", "There are no items to clear.")
 
     def save_data(self):
+        """Ask the persistence worker to compact the store; returns immediately."""
+        self.store.compact()
+
+    def _poll_background(self):
+        self._report_errors()
+        self.apply_remote_changes()
+        if self._listed_version is not self.store.versions.current:
+            self._update_versions_list()
+        if self._overlay is not None:
+            self._overlay.configure(text=tracer.format_summary(12))
+            self._overlay.lift()
+        if self._load_job is None:
+            # Items other windows added
+            self._index_next_batch()
+        self.root.after(500, self._poll_background)
+
+    def _report_errors(self):
+        # Errors from the persistence and clipboard worker threads
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.items, f, indent=4)
-        except Exception as e:
-            print(f"Error saving data: {e}")
-            messagebox.showerror("Error", f"Could not save data: {e}")
+            error = self.store.persistence.errors.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            print(f"Could not save data: {error}")
+            if self.canvas is not None:
+                self.status_label.configure(text=f"Could not save data: {error}")
+        try:
+            error = self._copy_errors.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            print(f"Copy failed: {error}")
+            self.show_toast(f"Copy failed: {error}", error=True)
+
+    def toggle_overlay(self, event=None):
+        """Show or hide the timing overlay; showing it starts the tracer."""
+        if self._overlay is not None:
+            self._overlay.destroy()
+            self._overlay = None
+            return
+        tracer.enable()
+        self._overlay = tk.Label(
+            self.root,
+            font=("Consolas", 8),
+            bg='#0f172a',
+            fg='#e2e8f0',
+            justify='left',
+            anchor='nw',
+            padx=6,
+            pady=4
+        )
+        self._overlay.place(relx=1.0, x=-8, y=8, anchor='ne')
+        self._overlay.configure(text=tracer.format_summary(12) or "Tracing…")
+
+    def apply_remote_changes(self):
+        """Show what other windows sharing the data file added or deleted, row by row."""
+        self.show_changes(self.store.sync())
+
+    def show_changes(self, ops):
+        """Update the rows for ops the store has applied already; other rows keep their widgets."""
+        if not ops or self._showing_history or self.canvas is None:
+            return
+        if any(op[0] == 'clear' for op in ops) or len(ops) > MAX_ROW_UPDATES:
+            self.refresh_items()
+            return
+        # The store already holds the outcome, so stale rows go before new ones come in
+        for op in ops:
+            if op[0] == 'delete':
+                self.remove_item_row(op[1])
+        for op in ops:
+            if op[0] != 'add' or op[1] not in self.items:
+                continue
+            if not self._query.strip() or self.store.matches(op[1], self._query):
+                # Below the hot section the view is newest first, and a remote key may be older than local ones
+                index = self._pinned + bisect_left([-key for key in self._view_keys[self._pinned:]], -op[1])
+                self.insert_item_row(op[1], index)
 
     def load_data(self):
+        """Show the newest page of saved items and stream in the rest."""
+        self.store.start_loading()
+        self._load_next_page()
+
+    def _load_next_page(self):
+        self._load_job = None
+        if not self.store.loading:
+            return
+        page = self._read_loader(LOAD_PAGE_SIZE)
+        with tracer.span('render.append', rows=len(page)):
+            self.append_item_rows(page)
+        if self.store.loading:
+            self._load_job = self.root.after(1, self._load_next_page)
+        else:
+            # Then the search index, in the same kind of idle steps
+            self._load_job = self.root.after(1, self._index_next_batch)
+
+    def _index_next_batch(self):
+        self._load_job = None
+        if self.store.index_pending():
+            self._load_job = self.root.after(1, self._index_next_batch)
+
+    def _finish_loading(self):
+        """Read whatever is still unloaded, e.g. before a duplicate-title check."""
+        if self.store.loading:
+            self._stop_job()
+            self.append_item_rows(self._read_loader(None))
+
+    def _stop_loading(self):
+        self._stop_job()
+        self.store.stop_loading()
+
+    def _stop_job(self):
+        if self._load_job is not None:
+            self.root.after_cancel(self._load_job)
+            self._load_job = None
+
+    def _read_loader(self, limit):
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    loaded_items = json.load(f)
-                    if isinstance(loaded_items, list):
-                        self.items = loaded_items
-                    else:
-                        self.items = []
-            else:
-                self.items = []
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from {self.data_file}. Starting with an empty list.")
-            self.items = []
+            return self.store.load_page(limit)
         except Exception as e:
             print(f"Error loading data: {e}")
             messagebox.showerror("Error", f"Could not load data: {e}")
-            self.items = []
+            # Show whatever was read before the failure
+            self.refresh_items()
+            return []
+
+    def start_server(self, path=None):
+        """Answer clipboard_ipc requests on a Unix socket, by default the data file's."""
+        if not hasattr(socket, 'AF_UNIX'):
+            return
+        try:
+            path = path or socket_path(self.store.data_file)
+        except OSError as e:
+            print(f"Could not start the request server: {e}")
+            return
+        server = IPCServer(path, self.handle_request)
+        try:
+            started = server.start()
+        except OSError as e:
+            print(f"Could not start the request server: {e}")
+            started = False
+        if not started:
+            # Most likely another window on the same data file serves it already
+            server.close()
+            return
+        self.server = server
+        if self.root is not None:
+            self._watch_server()
+
+    def _watch_server(self):
+        # Before the root exists, _run_resident() waits on the same fd instead
+        if hasattr(self.root.tk, 'createfilehandler'):
+            self.root.tk.createfilehandler(self.server.notify_fd, tk.READABLE,
+                                           lambda fd, mask: self.server.run_pending())
+        else:
+            self._poll_server()
+
+    def _poll_server(self):
+        # Tk on Windows has no createfilehandler
+        self.server.run_pending()
+        self.root.after(50, self._poll_server)
+
+    def handle_request(self, request):
+        """Answer one clipboard_ipc request; errors are sent back as their message."""
+        op = request.get('op')
+        if op == 'search':
+            keys = self.store.search(str(request.get('query', '')))[:int(request.get('limit', 20))]
+            return [{'key': key, 'title': self.items[key].display_title} for key in keys]
+        if op == 'add':
+            self._finish_loading()
+            key = self.store.add(parse_record(request.get('item')))
+            if not self._showing_history and self.store.matches(key, self._query):
+                self.insert_item_row(key)
+            return key
+        if op == 'show':
+            self.show_window()
+            return None
+        if op == 'launcher':
+            self.open_launcher()
+            return None
+        if op == 'hide':
+            if self.root is not None:
+                self.hide_window()
+            return None
+        if op == 'quit':
+            self.quit()
+            return None
+        if op not in ('get', 'copy', 'delete'):
+            raise ValueError(f"unknown op {op!r}")
+
+        self._finish_loading()
+        title = request.get('title')
+        key = self.store.find_title(title)
+        if key is None:
+            raise LookupError(f"No item titled {title!r}")
+        if op == 'delete':
+            self.delete_item(key)
+            return key
+        label = request.get('label')
+        text = self.store.copy_text(key, label)
+        if text is None:
+            raise LookupError(f"{title!r} has no context labelled {label!r}")
+        if op == 'get':
+            return text
+        self.copy_to_clipboard(text, key, label)
 
     def run(self):
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        if self.root is None:
+            self._run_resident()
+            if self.root is None:
+                self.on_closing()
+                return
         self.root.mainloop()
 
+    def _run_resident(self):
+        """Serve requests and sync the store without Tk, until a request needs a window or quit()."""
+        selector = selectors.DefaultSelector()
+        selector.register(self.server.notify_fd, selectors.EVENT_READ)
+        try:
+            while self.root is None and not self._quitting:
+                # Only wait for requests once the search index is built
+                if selector.select(0 if self.store.index_pending() else RESIDENT_POLL):
+                    self.server.run_pending()
+                self.store.sync()
+                self._report_errors()
+        except KeyboardInterrupt:
+            self._quitting = True
+        finally:
+            selector.close()
+
+    def quit(self):
+        """Stop the resident mode or close the window, after answering the current request."""
+        self._quitting = True
+        if self.root is not None:
+            # Not on_closing() right away: the server's reply is still to be sent
+            self.root.after_idle(self.on_closing)
+
     def on_closing(self):
-        self.save_data()
-        self.root.destroy()
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.server is not None:
+            if self.root is not None and hasattr(self.root.tk, 'deletefilehandler'):
+                self.root.tk.deletefilehandler(self.server.notify_fd)
+            self.server.close()
+            self.server = None
+        self._stop_loading()
+        if self.clipboard is not None:
+            self.clipboard.close()
+        # Flush whatever is still coalescing before the window goes away
+        self.store.close()
+        if self.root is not None:
+            self.root.destroy()
 
 if __name__ == "__main__":
-    app = ClipboardManager()
-    app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="One-Click Clipboard Manager")
+    parser.add_argument("--data-file", default="clipboard_data.json")
+    parser.add_argument("--backend", choices=sorted(STORAGE_BACKENDS), default='journal')
+    parser.add_argument("--save-delay", type=float, default=SAVE_DELAY,
+                        help="seconds to coalesce changes before writing them")
+    parser.add_argument("--clipboard", choices=sorted(CLIPBOARD_BACKENDS),
+                        help="default: pyperclip if it is installed, since tk loses the text on exit under X11")
+    parser.add_argument("--watch", action='store_true', help="record clipboard history in the background")
+    parser.add_argument("--no-serve", action='store_true', help="don't answer clipboard_ipc requests")
+    parser.add_argument("--resident", action='store_true',
+                        help="start hidden, without Tk, until clipboard_ipc asks for a window")
+    parser.add_argument("--encrypt", action='store_true',
+                        help="encrypt values written from now on; asks for a new passphrase")
+    parser.add_argument("--trace", metavar='FILE',
+                        help="time load, save, render, copy and search; write a Chrome trace on exit")
+    parser.add_argument("--trace-overlay", action='store_true', help="show the timings in the window (F12)")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracer.enable()
+    app = ClipboardManager(args.data_file, args.backend, args.save_delay, args.clipboard, args.watch,
+                           not args.no_serve, args.encrypt, overlay=args.trace_overlay, resident=args.resident)
+    app.run()
+    if args.trace:
+        tracer.write_chrome_trace(args.trace)
+        print(tracer.format_summary(), file=sys.stderr)
\ No newline at end of file
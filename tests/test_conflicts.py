@@ -0,0 +1,60 @@
+import pytest
+
+from clipboard_store import ConflictError, Item, ItemStore, STORAGE_BACKENDS
+
+
+@pytest.fixture(params=sorted(STORAGE_BACKENDS))
+def open_store(request, tmp_path):
+    stores = []
+
+    def open_store():
+        store = ItemStore(str(tmp_path / "clipboard_data.json"), request.param, save_delay=0)
+        store.load_all()
+        stores.append(store)
+        return store
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def titles(store):
+    return sorted(item.title for item in store.items.values())
+
+
+def test_same_title_from_two_processes(open_store):
+    first, second = open_store(), open_store()
+    first.add(Item.multi_context("Same", [("a", "1")]))
+    first.flush()
+    # second has not synced, so its own duplicate check lets the title through
+    second.add(Item.multi_context("Other", [("b", "2")]))
+    second.add(Item.multi_context("Same", [("c", "3")]))
+    second.flush()
+
+    error = second.persistence.errors.get_nowait()
+    assert isinstance(error, ConflictError)
+    assert [op[2].title for op in error.ops] == ["Same"]
+    ops = second.sync()
+    assert [op[0] for op in ops] == ['delete', 'add']
+    assert titles(second) == ["Other", "Same"]
+    assert second.copy_text(second.find_title("Same"), "a") == "1"
+
+    reloaded = open_store()
+    assert titles(reloaded) == ["Other", "Same"]
+
+
+def test_replacing_an_item_another_process_deleted(open_store):
+    first = open_store()
+    key = first.add(Item.multi_context("Gone", [("a", "1")]))
+    first.add(Item.multi_context("Kept", [("b", "2")]))
+    first.flush()
+    second = open_store()
+
+    first.delete(key)
+    first.flush()
+    second.persistence.submit_many([('delete', key), ('add', key, second.items[key])])
+    second.flush()
+
+    assert isinstance(second.persistence.errors.get_nowait(), ConflictError)
+    second.sync()
+    assert titles(second) == ["Kept"]
+    assert titles(open_store()) == ["Kept"]
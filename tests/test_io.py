@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+
+import clipboard_cli
+from clipboard_io import FORMATS, guess_format, read_items, write_items
+from clipboard_store import Item, ItemStore
+
+ITEMS = [
+    Item.multi_context("GitHub", [("Token", "ghp_x"), ("User", "me, with a comma")]),
+    Item.multi_context("Quotes", [("Text", 'say "hi"\nnext line')]),
+    Item('simple', "Note", content="plain content"),
+    Item('text', content="bare text"),
+]
+
+
+def round_trip(items, fmt):
+    f = io.StringIO(newline='')
+    write_items(f, items, fmt)
+    f.seek(0)
+    errors = []
+    read = list(read_items(f, fmt, lambda position, message: errors.append((position, message))))
+    return read, errors
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_round_trip(fmt):
+    read, errors = round_trip(ITEMS, fmt)
+    assert errors == []
+    assert [item.to_json() for item in read] == [item.to_json() for item in ITEMS]
+
+
+def test_csv_rows_with_one_title_form_one_item():
+    read, _ = round_trip([Item.multi_context("Same", [("a", "1")]), Item.multi_context("Same", [("b", "2")])], 'csv')
+    assert [item.to_json() for item in read] == [Item.multi_context("Same", [("a", "1"), ("b", "2")]).to_json()]
+
+
+@pytest.mark.parametrize('fmt, text, position', [
+    ('jsonl', '{"title": "Ok", "content": "x"}\n{not json\n[1]\n', ["line 2", "line 3"]),
+    ('json', '[{"title": "Ok", "content": "x"}, {"type": "multi_context", "contexts": []}, 5]', ["element 2", "element 3"]),
+    ('csv', 'title,label,value\nOk,,x\nBad,row\nNo value,a,\n', ["line 3", "line 4"]),
+])
+def test_bad_records_are_reported_and_skipped(fmt, text, position):
+    errors = []
+    read = list(read_items(io.StringIO(text), fmt, lambda where, message: errors.append(where)))
+    assert [item.to_json() for item in read] == [{"title": "Ok", "content": "x"}]
+    assert errors == position
+
+
+def test_guess_format():
+    assert guess_format("backup.CSV") == 'csv'
+    assert guess_format("backup.jsonl") == 'jsonl'
+    assert guess_format("backup.txt") == 'json'
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_cli_export_then_import(tmp_path, fmt, capsys):
+    source = str(tmp_path / "source.json")
+    store = ItemStore(source, save_delay=0)
+    store.load_all()
+    for item in ITEMS:
+        store.add(item)
+    store.add(Item.multi_context("Big", [("Body", "y" * 5000)]))
+    store.close()
+
+    exported = str(tmp_path / f"export.{fmt}")
+    clipboard_cli.main(["--data-file", source, "export", exported])
+    target = str(tmp_path / "target.json")
+    clipboard_cli.main(["--data-file", target, "import", exported])
+    # A second import only finds duplicates, except for the untitled item
+    clipboard_cli.main(["--data-file", target, "import", exported])
+    assert "Imported 1 items, skipped 4 duplicates" in capsys.readouterr().err
+
+    store = ItemStore(target, save_delay=0)
+    store.load_all()
+    texts = sorted(json.dumps(store.resolve_item(key).to_json()) for key in store.items)
+    store.close()
+    expected = sorted(json.dumps(item.to_json())
+                      for item in ITEMS + [Item.multi_context("Big", [("Body", "y" * 5000)]), ITEMS[3]])
+    assert texts == expected
@@ -0,0 +1,84 @@
+import os
+import selectors
+import socket
+import threading
+
+import pytest
+
+import clipboard_ipc
+from clipboard_ipc import IPCError, IPCServer, request, socket_path
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def server(tmp_path):
+    def dispatch(payload):
+        if payload.get('op') == 'fail':
+            raise LookupError("no such item")
+        return {'echo': payload}
+
+    server = IPCServer(str(tmp_path / "test.sock"), dispatch)
+    assert server.start()
+    stop = threading.Event()
+
+    # Stands in for the Tk thread, which answers when notify_fd turns readable
+    def answer():
+        with selectors.DefaultSelector() as selector:
+            selector.register(server.notify_fd, selectors.EVENT_READ)
+            while not stop.is_set():
+                if selector.select(0.05):
+                    server.run_pending()
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    yield server
+    stop.set()
+    thread.join()
+    server.close()
+
+
+def test_request_and_reply(server):
+    assert request(server.path, {'op': 'get', 'title': "GitHub"}) == {'echo': {'op': 'get', 'title': "GitHub"}}
+
+
+def test_errors_come_back_as_ipc_errors(server):
+    with pytest.raises(IPCError, match="no such item"):
+        request(server.path, {'op': 'fail'})
+
+
+def test_bad_lines_get_an_error_and_the_connection_stays_open(server):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(server.path)
+        with sock.makefile('rwb') as f:
+            for line, expected in ((b"{not json\n", b"invalid JSON"), (b"[1]\n", b"expected a JSON object"),
+                                   (b'{"op": "ping"}\n', b'"ok": true')):
+                f.write(line)
+                f.flush()
+                assert expected in f.readline()
+
+
+def test_a_second_server_does_not_take_over(server):
+    other = IPCServer(server.path, lambda payload: None)
+    assert not other.start()
+    other.close()
+
+
+def test_socket_is_private(server):
+    assert os.stat(server.path).st_mode & 0o077 == 0
+
+
+def test_socket_directory_must_be_private(tmp_path, monkeypatch):
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setattr(clipboard_ipc.tempfile, 'gettempdir', lambda: str(tmp_path))
+    path = socket_path("clipboard_data.json")
+    directory = os.path.dirname(path)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+    os.chmod(directory, 0o755)
+    with pytest.raises(PermissionError):
+        socket_path("clipboard_data.json")
+    os.rmdir(directory)
+    os.symlink(str(tmp_path), directory)
+    with pytest.raises(PermissionError):
+        socket_path("clipboard_data.json")
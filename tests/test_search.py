@@ -0,0 +1,56 @@
+import random
+import string
+
+import pytest
+
+from clipboard_store import Item, SearchIndex
+
+QUERIES = ["hello world", "world hello", "token user", "4999 item", "item 12", "ab", "zz-no-match",
+           "hello", "user 7 token", ""]
+
+
+def brute_force(texts, query):
+    words = query.lower().split()
+    return {key for key, text in texts.items() if all(word in text for word in words)}
+
+
+def random_items(count, seed=0):
+    rng = random.Random(seed)
+    labels = ["Token", "User", "Host", "world"]
+    items = {}
+    for key in range(count):
+        contexts = [(rng.choice(labels), f"{key} " + "".join(rng.choices(string.ascii_letters, k=rng.randint(1, 40))))
+                    for _ in range(rng.randint(1, 4))]
+        items[key] = Item.multi_context(f"Item {key}", contexts)
+    return items
+
+
+def test_words_need_not_be_adjacent():
+    index = SearchIndex()
+    index.add(1, Item.multi_context("hello", [("world", "x")]))
+    index.add(2, Item.multi_context("hello world", [("Note", "x")]))
+    index.add(3, Item.multi_context("hello", [("Note", "x")]))
+    assert index.search("hello world") == {1, 2}
+    assert index.search("world hello") == {1, 2}
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_search_matches_brute_force(query):
+    items = random_items(5000)
+    index = SearchIndex()
+    for key, item in items.items():
+        index.add(key, item)
+    index.index_pending(1000)
+    # Removing and re-adding leaves dead slots behind and reindexes
+    for key in range(0, 5000, 3):
+        index.remove(key)
+    for key in range(0, 5000, 6):
+        index.add(key, items[key])
+    texts = {key: items[key].search_text() for key in index._texts}
+    assert index.search(query) == brute_force(texts, query)
+
+
+def test_long_items_are_always_candidates():
+    index = SearchIndex()
+    index.add(1, Item('text', content="x" * SearchIndex.INDEXED_CHARS + " needle"))
+    assert index.search("needle") == {1}
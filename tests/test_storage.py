@@ -0,0 +1,144 @@
+import io
+import json
+
+import pytest
+
+from clipboard_store import (
+    BLOB_THRESHOLD, BinarySnapshot, BlobRef, Item, ItemStore, JournalStorage, SealedValue, STORAGE_BACKENDS,
+)
+
+
+def sample_items():
+    """(key, item) pairs newest first, covering every kind of item and value."""
+    return [
+        (7, Item.multi_context("Multi", [("Token", "abc"), ("User", "shared value, long enough")])),
+        (6, Item.multi_context("Other", [("User", "shared value, long enough"), ("Empty", "")])),
+        (5, Item('simple', "Simple", content="content")),
+        (4, Item('simple', None, content=None)),
+        (3, Item('text', content="bare text \ud800 with a lone surrogate")),
+        (2, Item.multi_context("Blob", [("Big", BlobRef("ab" * 32, 5000, "preview"))])),
+        (1, Item('text', content=SealedValue("bound:token"))),
+    ]
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib'])
+def test_binary_snapshot_round_trip(codec, monkeypatch):
+    # Small blocks, so items span several of them
+    monkeypatch.setattr('clipboard_store.SNAPSHOT_BLOCK_ITEMS', 3)
+    items = sample_items()
+    labels = {context.label: None for _, item in items for context in item.contexts}
+    f = io.BytesIO()
+    BinarySnapshot.write(f, 42, iter(items), ["shared value, long enough"], list(labels), codec=codec)
+
+    f.seek(0)
+    seq, read = BinarySnapshot.read(f)
+    read = list(read)
+    assert seq == 42
+    assert [key for key, _ in read] == [7, 6, 5, 4, 3, 2, 1]
+    assert repr(read) == repr(items)
+    assert read[0][1].contexts[1].value is read[1][1].contexts[0].value
+
+    f.seek(0)
+    seq, blocks = BinarySnapshot.scan(f)
+    values = [value for _, block_values in blocks for value in block_values]
+    assert len(values) == sum(len(item.values()) or 1 for _, item in items)
+
+
+def test_binary_snapshot_rejects_damage():
+    f = io.BytesIO()
+    BinarySnapshot.write(f, 1, sample_items(), [], ["Token", "User", "Empty", "Big"], codec='zlib')
+    with pytest.raises(ValueError):
+        list(BinarySnapshot.read(io.BytesIO(f.getvalue()[:-20]))[1])
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / "clipboard_data.json")
+
+
+def reopen(data_file, backend, **kwargs):
+    store = ItemStore(data_file, backend, save_delay=0, **kwargs)
+    store.load_all()
+    return store
+
+
+@pytest.mark.parametrize('backend', sorted(STORAGE_BACKENDS))
+def test_legacy_data_file_is_migrated(data_file, backend):
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump(["bare", {"title": "Old", "content": "x"},
+                   {"title": "New", "type": "multi_context", "contexts": [{"label": "a", "value": "b"}]}], f)
+    store = reopen(data_file, backend)
+    assert [store.items[key].to_json() for key in sorted(store.items)] == [
+        "bare", {"title": "Old", "content": "x"},
+        {"title": "New", "type": "multi_context", "contexts": [{"label": "a", "value": "b"}]},
+    ]
+    store.close()
+
+
+@pytest.mark.parametrize('backend', sorted(STORAGE_BACKENDS))
+def test_changes_survive_reopening(data_file, backend):
+    store = reopen(data_file, backend)
+    keys = [store.add(Item.multi_context(f"Item {i}", [("Label", f"value {i}")])) for i in range(10)]
+    big = "x" * (BLOB_THRESHOLD + 1)
+    blob_key = store.add(Item.multi_context("Big", [("Body", big)]))
+    store.delete(keys[3])
+    store.close()
+
+    store = reopen(data_file, backend)
+    assert sorted(item.title for item in store.items.values()) == sorted(
+        [f"Item {i}" for i in range(10) if i != 3] + ["Big"])
+    assert isinstance(store.items[blob_key].contexts[0].value, BlobRef)
+    assert store.copy_text(blob_key, "Body") == big
+    store.clear()
+    store.add(Item.multi_context("After clear", [("a", "b")]))
+    store.close()
+
+    store = reopen(data_file, backend)
+    assert [item.title for item in store.items.values()] == ["After clear"]
+    store.close()
+
+
+@pytest.mark.parametrize('snapshot_format', ['binary', 'json'])
+def test_journal_compaction_keeps_the_items(data_file, snapshot_format):
+    store = reopen(data_file, 'journal')
+    store.storage.snapshot_format = snapshot_format
+    keys = [store.add(Item.multi_context(f"Item {i}", [("Label", "repeated value " * 2)])) for i in range(20)]
+    store.flush()
+    store.storage.compact()
+    # Journal records on top of the snapshot, then a second compaction reading both
+    store.delete(keys[0])
+    replaced = store.add(Item('simple', "Simple", content="text"))
+    store.flush()
+    store.storage.compact()
+    expected = {key: item.to_json() for key, item in store.items.items()}
+    store.close()
+
+    storage = JournalStorage(data_file)
+    assert {key: item.to_json() for key, item in storage.iter_items()} == expected
+    assert list(dict(storage.iter_items())) == sorted(expected, reverse=True)
+    assert replaced in expected and keys[0] not in expected
+    storage.close()
+
+
+def test_journal_torn_write_is_dropped(data_file):
+    store = reopen(data_file, 'journal')
+    store.add(Item.multi_context("Kept", [("a", "b")]))
+    store.close()
+    with open(JournalStorage(data_file).journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "key": 99, "item": {"tit')
+    store = reopen(data_file, 'journal')
+    assert [item.title for item in store.items.values()] == ["Kept"]
+    store.close()
+
+
+@pytest.mark.parametrize('backend', sorted(STORAGE_BACKENDS))
+def test_other_processes_changes_are_synced(data_file, backend):
+    first, second = reopen(data_file, backend), reopen(data_file, backend)
+    key = first.add(Item.multi_context("Shared", [("a", "b")]))
+    first.flush()
+    assert second.sync() == [('add', key, second.items[key])]
+    first.delete(key)
+    first.flush()
+    assert second.sync() == [('delete', key)]
+    first.close()
+    second.close()
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("cryptography")
+
+from clipboard_store import (  # noqa: E402
+    Item, ItemStore, PassphraseError, SealedValue, Vault, key_file_path,
+)
+
+
+@pytest.fixture(autouse=True)
+def cheap_scrypt(monkeypatch):
+    monkeypatch.setattr(Vault, 'SCRYPT_COST', {'n': 2 ** 10, 'r': 8, 'p': 1})
+
+
+@pytest.fixture
+def vault(tmp_path):
+    return Vault(str(tmp_path / "store.key"), "secret")
+
+
+def test_bound_value_opens_only_where_it_was_sealed(vault):
+    sealed = vault.seal("ghp_x", 5, "Token")
+    assert vault.is_bound(sealed)
+    assert vault.open(sealed, 5, "Token") == "ghp_x"
+    for key, label in ((6, "Token"), (5, "User"), (5, None), (None, None)):
+        with pytest.raises(ValueError):
+            vault.open(sealed, key, label)
+
+
+def test_unbound_tokens_still_open(vault):
+    sealed = vault.seal("legacy")
+    assert not vault.is_bound(sealed)
+    assert vault.open(sealed, 5, "Token") == "legacy"
+
+
+def test_tampered_token_fails(vault):
+    token = vault.seal("value", 1, None).token
+    tampered = token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB")
+    with pytest.raises(ValueError):
+        vault.open(SealedValue(tampered), 1, None)
+
+
+def test_wrong_passphrase(vault):
+    with pytest.raises(PassphraseError):
+        Vault(vault.key_file, "wrong")
+    assert Vault(vault.key_file, "secret").open(vault.seal("x", 1, "a"), 1, "a") == "x"
+
+
+@pytest.mark.parametrize('backend', ['journal', 'sqlite'])
+def test_encrypted_store(tmp_path, backend):
+    data_file = str(tmp_path / "clipboard_data.json")
+    store = ItemStore(data_file, backend, save_delay=0)
+    store.load_all()
+    plain = store.add(Item.multi_context("Before", [("Token", "plaintext-before")]))
+    store.close()
+
+    store = ItemStore(data_file, backend, save_delay=0, passphrase="secret")
+    store.load_all()
+    assert store.seal_all() == 1
+    key = store.add(Item.multi_context("After", [("Token", "plaintext-after")]))
+    store.compact()
+    store.close()
+
+    with pytest.raises(PassphraseError):
+        ItemStore(data_file, backend, save_delay=0)
+    store = ItemStore(data_file, backend, save_delay=0, passphrase="secret")
+    store.load_all()
+    assert all(Vault.is_bound(value) for item in store.items.values() for value in item.values())
+    assert store.copy_text(plain, "Token") == "plaintext-before"
+    assert store.copy_text(key) == "Token: plaintext-after"
+    # A value moved to another item no longer opens
+    with pytest.raises(ValueError):
+        store.resolve(store.items[key].contexts[0].value, plain, "Token")
+    store.close()
+
+    for name in tmp_path.iterdir():
+        if name.name != "clipboard_data.json" and name.is_file():
+            assert b"plaintext-after" not in name.read_bytes(), name
+    assert key_file_path(data_file).endswith(".key")
@@ -0,0 +1,93 @@
+import pytest
+
+from clipboard_store import DuplicateTitleError, Item, ItemStore, VersionLog
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ItemStore(str(tmp_path / "clipboard_data.json"), save_delay=0)
+    store.load_all()
+    yield store
+    store.close()
+
+
+def titles(store):
+    return sorted(item.title for item in store.items.values())
+
+
+def add(store, title):
+    return store.add(Item.multi_context(title, [("a", title.lower())]))
+
+
+def test_undo_and_redo(store):
+    add(store, "One")
+    two = add(store, "Two")
+    store.delete(two)
+    assert titles(store) == ["One"]
+
+    assert store.undo() == [('add', two, store.items[two])]
+    assert titles(store) == ["One", "Two"]
+    store.undo()
+    store.undo()
+    assert titles(store) == []
+    assert store.undo() is None
+
+    store.redo()
+    store.redo()
+    assert titles(store) == ["One", "Two"]
+    store.redo()
+    assert titles(store) == ["One"]
+    assert store.redo() is None
+
+
+def test_undo_clear_brings_every_item_back(store):
+    for title in ("One", "Two", "Three"):
+        add(store, title)
+    store.clear()
+    store.undo()
+    assert titles(store) == ["One", "Three", "Two"]
+
+
+def test_undo_is_saved(store, tmp_path):
+    add(store, "One")
+    store.undo()
+    store.close()
+    reopened = ItemStore(str(tmp_path / "clipboard_data.json"), save_delay=0)
+    reopened.load_all()
+    assert titles(reopened) == []
+    reopened.close()
+
+
+def test_a_change_after_undo_starts_a_branch(store):
+    add(store, "One")
+    branch = store.versions.current.number
+    store.undo()
+    add(store, "Other")
+    assert store.redo() is None
+
+    store.restore(branch)
+    assert titles(store) == ["One"]
+    assert [version.description for version in store.versions.history()] == ["Opened", "Added One", "Added Other"]
+
+
+def test_undo_refuses_a_title_taken_since(store, tmp_path):
+    key = add(store, "Same")
+    store.delete(key)
+    # Another process takes the title; synced changes aren't versions
+    other = ItemStore(str(tmp_path / "clipboard_data.json"), save_delay=0)
+    other.load_all()
+    add(other, "Same")
+    other.close()
+    store.sync()
+    with pytest.raises(DuplicateTitleError):
+        store.undo()
+    assert titles(store) == ["Same"]
+    assert key not in store.items
+
+
+def test_old_versions_are_dropped():
+    log = VersionLog(limit=3)
+    for number in range(5):
+        log.record([(number, None, Item('text', content=str(number)))], f"Added {number}")
+    assert sorted(log.versions) == [3, 4, 5]
+    assert log.root.parent is None